@@ -3,21 +3,61 @@ from ._impl import (
     async_generator,
     yield_,
     yield_from_,
+    yield_many_,
+    anext_batch,
+    enable_stats,
     isasyncgen,
     isasyncgenfunction,
     get_asyncgen_hooks,
     set_asyncgen_hooks,
 )
 from ._util import aclosing, asynccontextmanager
+from ._finalize import batched_finalizer, shutdown_asyncgens
+from ._concurrent import prefetch, amap, aprocess_map, amerge
+from ._tee import atee
+from ._threads import from_sync_iter
+from ._sync import iterate_sync, to_sync_iter
+from ._cache import cached_async_generator, disk_cached_async_generator
+from ._bytes import AsyncByteStream, IncompleteReadError, mmap_chunks
+from ._pipeline import pipeline
+from ._arrays import abatch_array
+from ._registry import (
+    track_asyncgens,
+    asyncgen_census,
+    format_asyncgen_census,
+)
 
 __all__ = [
     "async_generator",
     "yield_",
     "yield_from_",
+    "yield_many_",
+    "anext_batch",
+    "enable_stats",
     "aclosing",
     "isasyncgen",
     "isasyncgenfunction",
     "asynccontextmanager",
     "get_asyncgen_hooks",
     "set_asyncgen_hooks",
+    "batched_finalizer",
+    "shutdown_asyncgens",
+    "prefetch",
+    "amap",
+    "aprocess_map",
+    "amerge",
+    "atee",
+    "from_sync_iter",
+    "iterate_sync",
+    "to_sync_iter",
+    "cached_async_generator",
+    "disk_cached_async_generator",
+    "AsyncByteStream",
+    "IncompleteReadError",
+    "mmap_chunks",
+    "pipeline",
+    "abatch_array",
+    "track_asyncgens",
+    "asyncgen_census",
+    "format_asyncgen_census",
 ]
@@ -0,0 +1,169 @@
+import array
+from itertools import chain
+from time import monotonic
+
+from ._impl import async_generator, yield_, anext_batch
+from ._util import aclosing, asynccontextmanager
+from ._backends import current_backend
+from ._background import serve, Pump, PumpState, VALUE, ERROR
+
+# abatch_array() packs the values from a generator into arrays, so that the
+# consumer can work on a block of them at a time. Each batch is written into
+# the same preallocated buffer, and what we yield is a view of (the filled
+# part of) it, so batches don't allocate anything per value, or per batch.
+#
+# The buffer is a NumPy array if NumPy is installed, and an array.array
+# otherwise. Either way, we only allocate it once we've seen the first value,
+# since that's when we know whether the values are numbers or rows of them
+# (or, for NumPy, records of a structured dtype).
+
+
+def _import_numpy():
+    try:
+        import numpy
+    except ImportError:
+        return None
+    return numpy
+
+
+class _Batch:
+    def __init__(self, size, dtype):
+        if size < 1:
+            raise ValueError("size must be at least 1")
+        self.size = size
+        self.count = 0
+        self._numpy = _import_numpy()
+        if self._numpy is not None:
+            self._dtype = self._numpy.dtype(dtype)
+        else:
+            # This checks the typecode
+            array.array(dtype)
+            self._dtype = dtype
+        self._buffer = None
+        # For array.array, the length of each row, or None if the values are
+        # numbers
+        self._width = None
+
+    @property
+    def space(self):
+        return self.size - self.count
+
+    def _allocate(self, first):
+        if self._numpy is not None:
+            shape = self._numpy.asarray(first, self._dtype).shape
+            self._buffer = self._numpy.empty((self.size,) + shape, self._dtype)
+            return
+        if isinstance(first, tuple):
+            self._width = len(first)
+        length = self.size * (self._width or 1)
+        self._buffer = array.array(self._dtype, [0]) * length
+
+    def add(self, values):
+        if self._buffer is None:
+            self._allocate(values[0])
+        start = self.count
+        end = start + len(values)
+        if self._numpy is not None:
+            self._buffer[start:end] = values
+        elif self._width is None:
+            self._buffer[start:end] = array.array(self._dtype, values)
+        else:
+            width = self._width
+            if any(len(row) != width for row in values):
+                raise ValueError("expected rows of length {}".format(width))
+            self._buffer[start * width:end * width] = array.array(
+                self._dtype, chain.from_iterable(values)
+            )
+        self.count = end
+
+    def take(self):
+        count = self.count
+        self.count = 0
+        if self._numpy is not None:
+            return self._buffer[:count]
+        view = memoryview(self._buffer)
+        if self._width is None:
+            return view[:count]
+        shape = (count, self._width)
+        return view[:count * self._width].cast("B").cast(self._dtype, shape)
+
+
+@async_generator
+async def _batches(agen, batch):
+    while True:
+        try:
+            values = await anext_batch(agen, batch.space)
+        except StopAsyncIteration:
+            break
+        except Exception as exc:
+            values = getattr(exc, "partial_batch", None)
+            if values:
+                batch.add(values)
+            if batch.count:
+                await yield_(batch.take())
+            raise
+        batch.add(values)
+        if not batch.space:
+            await yield_(batch.take())
+    if batch.count:
+        await yield_(batch.take())
+
+
+@async_generator
+async def _timed_batches(group, backend, source, state, batch, timeout):
+    group.start_soon(source.pump)
+    # When the batch we're filling has to be yielded, full or not
+    deadline = None
+    while True:
+        state.ready = backend.Event()
+        values = []
+        kind = VALUE
+        while source.buffer and len(values) < batch.space:
+            (kind, payload) = source.take()
+            if kind is not VALUE:
+                break
+            values.append(payload)
+        if values:
+            batch.add(values)
+            if deadline is None:
+                deadline = monotonic() + timeout
+        if kind is not VALUE:
+            break
+        if not batch.space:
+            await yield_(batch.take())
+            deadline = None
+        elif source.buffer:
+            continue
+        elif deadline is None:
+            await state.ready.wait()
+        else:
+            remaining = deadline - monotonic()
+            if not await backend.wait_event(state.ready, remaining):
+                await yield_(batch.take())
+                deadline = None
+    if batch.count:
+        await yield_(batch.take())
+    if kind is ERROR:
+        raise payload
+
+
+@asynccontextmanager
+@async_generator
+async def abatch_array(agen, size, dtype, timeout=None):
+    async with aclosing(agen):
+        batch = _Batch(size, dtype)
+        if timeout is None:
+            async with aclosing(_batches(agen, batch)) as batches:
+                await yield_(batches)
+            return
+        if timeout <= 0:
+            raise ValueError("timeout must be positive")
+        backend = current_backend()
+        # A background task takes values from agen and puts them in
+        # source.buffer, so that we can stop waiting for the next one when
+        # the time's up, without cancelling agen.
+        state = PumpState()
+        source = Pump(backend, agen, size, state)
+        async with serve(backend, _timed_batches, backend, source, state,
+                         batch, timeout) as batches:
+            await yield_(batches)
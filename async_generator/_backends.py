@@ -0,0 +1,225 @@
+import logging
+
+# The helpers that need to run things concurrently (background tasks,
+# wakeups from other threads, ...) work with asyncio and trio. We ask sniffio
+# which one we're running under; it's not a dependency, but trio depends on
+# it, so if it's not installed then we must be running under asyncio.
+#
+# Each backend exposes the same small set of operations:
+#
+#   Event()                   -> an object with set(), is_set(), await wait()
+#   Queue(max_size)           -> a FIFO queue with await put(value) and
+#                                await get(); put() waits while it's full
+#   open_task_group()         -> an async context manager, whose value has
+#                                start_soon(async_fn, *args) and
+#                                cancel_scope.cancel(); exiting waits for all
+#                                the tasks
+#   start_cancellable(group, async_fn, *args)
+#                             -> like group.start_soon(async_fn, *args), but
+#                                returns a function that cancels just that
+#                                task (under trio, cancelling the nursery
+#                                would also cancel the body of its 'async
+#                                with', which might be the consumer's code)
+#   await sleep(seconds)
+#   await wait_event(event, seconds)
+#                             -> wait for event to be set, for at most
+#                                seconds; returns whether it was
+#   await run_in_thread(executor, fn, *args)
+#                             -> call fn(*args) in a worker thread (from
+#                                executor, if it isn't None) and return
+#                                its result
+#   await wait_future(future) -> wait for a concurrent.futures.Future and
+#                                return its result; if we're cancelled, the
+#                                future is cancelled too
+#   run_sync_soon(fn, *args)  -> call fn(*args) soon in the event loop's
+#                                thread; safe to call from any thread, or
+#                                from a finalizer
+#   report_error(message, exc)
+#                             -> report an exception that has nowhere to
+#                                propagate to
+#
+# Backends are imported lazily, so that importing async_generator doesn't
+# import asyncio or trio.
+
+logger = logging.getLogger("async_generator")
+
+
+def current_backend():
+    try:
+        import sniffio
+    except ImportError:
+        library = "asyncio"
+    else:
+        library = sniffio.current_async_library()
+    if library == "asyncio":
+        return _AsyncioBackend()
+    if library == "trio":
+        return _TrioBackend()
+    raise RuntimeError("unsupported async library {!r}".format(library))
+
+
+class _AsyncioBackend:
+    def __init__(self):
+        import asyncio
+        self._asyncio = asyncio
+        self._loop = asyncio.get_event_loop()
+
+    def Event(self):
+        return self._asyncio.Event()
+
+    def Queue(self, max_size):
+        return self._asyncio.Queue(max_size)
+
+    def open_task_group(self):
+        return _AsyncioTaskGroup(self._asyncio)
+
+    def start_cancellable(self, group, async_fn, *args):
+        return group.start_soon(async_fn, *args).cancel
+
+    async def sleep(self, seconds):
+        await self._asyncio.sleep(seconds)
+
+    async def wait_event(self, event, seconds):
+        try:
+            await self._asyncio.wait_for(event.wait(), max(seconds, 0))
+        except self._asyncio.TimeoutError:
+            pass
+        return event.is_set()
+
+    async def run_in_thread(self, executor, fn, *args):
+        return await self._loop.run_in_executor(executor, fn, *args)
+
+    async def wait_future(self, future):
+        return await self._asyncio.wrap_future(future)
+
+    def run_sync_soon(self, fn, *args):
+        try:
+            self._loop.call_soon_threadsafe(fn, *args)
+        except RuntimeError:
+            # The loop is closed, so nobody is waiting for this anymore
+            pass
+
+    def report_error(self, message, exc):
+        context = {"message": message, "exception": exc}
+        self._loop.call_exception_handler(context)
+
+
+class _AsyncioTaskGroup:
+    # Just enough of a trio nursery for our purposes. Unlike a nursery, an
+    # exception in a task doesn't cancel the others or the body: our tasks
+    # catch their own exceptions and pass them on wherever they need to go.
+
+    def __init__(self, asyncio):
+        self._asyncio = asyncio
+        self._tasks = set()
+
+    @property
+    def cancel_scope(self):
+        return self
+
+    def start_soon(self, async_fn, *args):
+        task = self._asyncio.ensure_future(async_fn(*args))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+        return task
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, type, value, traceback):
+        if type is not None:
+            self.cancel()
+        cancelled = None
+        errors = []
+        while self._tasks:
+            tasks = list(self._tasks)
+            try:
+                await self._asyncio.wait(tasks)
+            except self._asyncio.CancelledError as exc:
+                # We can't leave until the tasks are done, so cancel them
+                # too and keep waiting
+                cancelled = exc
+                self.cancel()
+            for task in tasks:
+                if not task.done() or task.cancelled():
+                    continue
+                if task.exception() is not None:
+                    errors.append(task.exception())
+        if cancelled is not None:
+            raise cancelled
+        if errors and type is None:
+            raise errors[0]
+        return False
+
+
+class _TrioBackend:
+    def __init__(self):
+        import trio
+        self._trio = trio
+        self._token = trio.lowlevel.current_trio_token()
+
+    def Event(self):
+        return self._trio.Event()
+
+    def Queue(self, max_size):
+        return _TrioQueue(self._trio, max_size)
+
+    def open_task_group(self):
+        return self._trio.open_nursery()
+
+    def start_cancellable(self, group, async_fn, *args):
+        scope = self._trio.CancelScope()
+
+        async def run():
+            with scope:
+                await async_fn(*args)
+
+        group.start_soon(run)
+        return scope.cancel
+
+    async def sleep(self, seconds):
+        await self._trio.sleep(seconds)
+
+    async def wait_event(self, event, seconds):
+        with self._trio.move_on_after(max(seconds, 0)):
+            await event.wait()
+        return event.is_set()
+
+    async def run_in_thread(self, executor, fn, *args):
+        if executor is None:
+            return await self._trio.to_thread.run_sync(fn, *args)
+        return await self.wait_future(executor.submit(fn, *args))
+
+    async def wait_future(self, future):
+        done = self._trio.Event()
+        future.add_done_callback(lambda _: self.run_sync_soon(done.set))
+        try:
+            await done.wait()
+        except BaseException:
+            future.cancel()
+            raise
+        return future.result()
+
+    def run_sync_soon(self, fn, *args):
+        try:
+            self._token.run_sync_soon(fn, *args)
+        except self._trio.RunFinishedError:
+            pass
+
+    def report_error(self, message, exc):
+        logger.error(message, exc_info=exc)
+
+
+class _TrioQueue:
+    def __init__(self, trio, max_size):
+        self._send, self._receive = trio.open_memory_channel(max_size)
+
+    async def put(self, value):
+        await self._send.send(value)
+
+    async def get(self):
+        return await self._receive.receive()
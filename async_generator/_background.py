@@ -0,0 +1,78 @@
+import collections
+
+from ._impl import async_generator, yield_
+from ._util import aclosing, asynccontextmanager
+
+# What the helpers that iterate async generators from background tasks
+# (prefetch(), amap(), amerge(), aprocess_map() and abatch_array()) share:
+# the kinds of message their tasks send to the consumer, serve() to keep the
+# tasks in the consumer's 'async with' block, and Pump to buffer a source.
+
+# Kinds of messages that background tasks send to the consumer
+VALUE = 0
+ERROR = 1
+DONE = 2
+
+
+@asynccontextmanager
+@async_generator
+async def serve(backend, results_fn, *args):
+    # The helpers that run several tasks at once are async context managers
+    # rather than plain async generators, because under trio, an async
+    # generator can't yield while it has a nursery open: if the consumer
+    # stopped iterating (e.g. with 'break') and left it to the garbage
+    # collector, the nursery would be closed from the wrong context. So the
+    # task group lives in the consumer's 'async with' block, and what we hand
+    # out is results_fn(group, *args), an async generator that starts tasks
+    # in it. Leaving the block closes that and cancels any tasks that are
+    # still running.
+    async with backend.open_task_group() as group:
+        try:
+            async with aclosing(results_fn(group, *args)) as results:
+                await yield_(results)
+        finally:
+            group.cancel_scope.cancel()
+
+
+class PumpState:
+    # Shared by all the pumps that feed one consumer; 'ready' is the Event
+    # the consumer is waiting on.
+    __slots__ = ("ready",)
+
+
+class Pump:
+    # Takes values from agen in a background task (run pump() in the task
+    # group), and keeps up to max_buffer of them in 'buffer' as (kind,
+    # payload) messages, for the consumer to take() whenever it likes. This
+    # way the consumer can wait for several sources at once, or stop
+    # waiting, without cancelling agen halfway through a step.
+    def __init__(self, backend, agen, max_buffer, state):
+        self.agen = agen
+        self.buffer = collections.deque()
+        self._backend = backend
+        self._max_buffer = max_buffer
+        self._space = backend.Event()
+        self._state = state
+
+    def take(self):
+        self._space.set()
+        return self.buffer.popleft()
+
+    def _put(self, message):
+        self.buffer.append(message)
+        self._state.ready.set()
+
+    async def pump(self):
+        while True:
+            while len(self.buffer) >= self._max_buffer:
+                self._space = self._backend.Event()
+                await self._space.wait()
+            try:
+                value = await self.agen.__anext__()
+            except StopAsyncIteration:
+                self._put((DONE, None))
+                return
+            except Exception as exc:
+                self._put((ERROR, exc))
+                return
+            self._put((VALUE, value))
@@ -0,0 +1,210 @@
+import collections
+import mmap
+import os
+import re
+import weakref
+
+from ._impl import async_generator, yield_
+
+# AsyncByteStream reads an async iterator of bytes-like chunks as a stream.
+# It keeps the chunks it has received, but not consumed yet, as memoryviews,
+# so that reading part of a chunk is just slicing it. Only a read that spans
+# several chunks has to copy anything, and then only the bytes it returns.
+
+
+class IncompleteReadError(EOFError):
+    def __init__(self, partial, expected):
+        super().__init__(
+            "{} bytes read on a total of {} expected bytes".format(
+                len(partial), "undefined" if expected is None else expected
+            )
+        )
+        self.partial = partial
+        self.expected = expected
+
+
+class AsyncByteStream:
+    def __init__(self, aiter):
+        self._aiter = aiter
+        self._chunks = collections.deque()
+        # Total bytes in _chunks
+        self._size = 0
+        self._eof = False
+
+    async def _fill(self):
+        # Waits for another chunk. Returns False at the end of the stream.
+        while not self._eof:
+            try:
+                chunk = await self._aiter.__anext__()
+            except StopAsyncIteration:
+                self._eof = True
+                break
+            view = memoryview(chunk)
+            if view.format != "B" or view.ndim != 1:
+                view = view.cast("B")
+            if view:
+                self._chunks.append(view)
+                self._size += len(view)
+                return True
+        return False
+
+    def _take(self, count):
+        # Removes the first count bytes (which we must have) from _chunks.
+        self._size -= count
+        first = self._chunks[0]
+        if len(first) >= count:
+            if len(first) == count:
+                self._chunks.popleft()
+            else:
+                self._chunks[0] = first[count:]
+            return first[:count]
+        out = bytearray(count)
+        self._copy_into(memoryview(out))
+        return memoryview(out)
+
+    def _copy_into(self, out):
+        pos = 0
+        while pos < len(out):
+            chunk = self._chunks.popleft()
+            count = min(len(chunk), len(out) - pos)
+            out[pos:pos + count] = chunk[:count]
+            pos += count
+            if count < len(chunk):
+                self._chunks.appendleft(chunk[count:])
+
+    def at_eof(self):
+        return self._eof and not self._size
+
+    async def readinto(self, buffer):
+        out = memoryview(buffer).cast("B")
+        if not out:
+            return 0
+        if not self._size and not await self._fill():
+            return 0
+        # Only what we already have; don't wait for more
+        count = min(len(out), self._size)
+        self._size -= count
+        self._copy_into(out[:count])
+        return count
+
+    async def readexactly(self, n):
+        if n < 0:
+            raise ValueError("n must not be negative")
+        while self._size < n:
+            if not await self._fill():
+                partial = bytes(self._take(self._size)) if self._size else b""
+                raise IncompleteReadError(partial, n)
+        if not n:
+            return memoryview(b"")
+        return self._take(n)
+
+    async def readuntil(self, separator=b"\n"):
+        separator = bytes(separator)
+        if not separator:
+            raise ValueError("separator must not be empty")
+        search = re.compile(re.escape(separator)).search
+        overlap = len(separator) - 1
+        # We look at each chunk once, even if we have to wait for more: the
+        # position in the stream where chunk i starts, and the overlap bytes
+        # before that (where a separator split across chunks would start).
+        i = 0
+        offset = 0
+        tail = b""
+        while True:
+            while i < len(self._chunks):
+                chunk = self._chunks[i]
+                if tail:
+                    match = search(tail + bytes(chunk[:overlap]))
+                    if match is not None:
+                        return self._take(offset - len(tail) + match.end())
+                match = search(chunk)
+                if match is not None:
+                    return self._take(offset + match.end())
+                if overlap:
+                    tail = (tail + bytes(chunk[-overlap:]))[-overlap:]
+                offset += len(chunk)
+                i += 1
+            if not await self._fill():
+                partial = bytes(self._take(self._size)) if self._size else b""
+                raise IncompleteReadError(partial, None)
+
+    async def aclose(self):
+        self._chunks.clear()
+        self._size = 0
+        self._eof = True
+        aclose = getattr(self._aiter, "aclose", None)
+        if aclose is not None:
+            await aclose()
+
+
+# mmap_chunks() yields slices of a memory-mapped file. They're all views of
+# the same mapping, so to unmap it when we're done, we have to release every
+# view we handed out first: we keep weak references to them, so we can do
+# that without keeping them alive ourselves.
+
+
+def _release_all(refs):
+    for ref in refs:
+        view = ref()
+        if view is not None:
+            try:
+                view.release()
+            except BufferError:
+                # Something's still using its buffer (e.g. a pending write).
+                # It keeps the mapping alive until it's done.
+                pass
+
+
+@async_generator
+async def mmap_chunks(file, chunk_size=1 << 20, *, sequential=False):
+    if chunk_size < 1:
+        raise ValueError("chunk_size must be at least 1")
+    if hasattr(file, "fileno"):
+        own_file = False
+    else:
+        file = open(file, "rb")
+        own_file = True
+    try:
+        size = os.fstat(file.fileno()).st_size
+        if not size:
+            # Empty files can't be mapped
+            return
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+        advise = sequential and hasattr(mapping, "madvise")
+        base = memoryview(mapping)
+        refs = []
+        prune_at = 64
+        try:
+            if advise:
+                mapping.madvise(mmap.MADV_SEQUENTIAL)
+            for start in range(0, size, chunk_size):
+                end = min(start + chunk_size, size)
+                if advise and end < size:
+                    # Start reading the next chunk in while they work on
+                    # this one (madvise wants page-aligned offsets)
+                    aligned = end - end % mmap.PAGESIZE
+                    mapping.madvise(
+                        mmap.MADV_WILLNEED, aligned,
+                        min(end + chunk_size, size) - aligned
+                    )
+                view = base[start:end]
+                refs.append(weakref.ref(view))
+                if len(refs) > prune_at:
+                    refs = [ref for ref in refs if ref() is not None]
+                    prune_at = max(64, 2 * len(refs))
+                await yield_(view)
+                del view
+        finally:
+            _release_all(refs)
+            base.release()
+            try:
+                mapping.close()
+            except BufferError:
+                # Someone made their own view of one of our chunks (e.g. by
+                # slicing it). Then the mapping is closed when they let go of
+                # it -- as long as we don't hold on to it too (our frame can
+                # outlive us, e.g. in a traceback).
+                del mapping, base
+    finally:
+        if own_file:
+            file.close()
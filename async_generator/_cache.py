@@ -0,0 +1,416 @@
+import collections
+import hashlib
+import mmap
+import os
+import pickle
+import re
+import struct
+import sys
+import tempfile
+from functools import partial, wraps
+from time import monotonic
+
+from ._impl import async_generator, yield_, yield_many_, isasyncgenfunction
+from ._util import aclosing
+
+# @cached_async_generator records the values from a generator's first
+# complete run, and later calls with the same arguments replay them instead
+# of running it again. Like functools.lru_cache, the arguments have to be
+# hashable (calls where they aren't just aren't cached), and there's one
+# cache per decorated function.
+#
+# Only runs that finish normally are recorded: if the generator raises, or
+# the consumer stops early (aclose(), or garbage collection), what we saw is
+# only part of the story.
+
+CacheInfo = collections.namedtuple(
+    "CacheInfo", ("hits", "misses", "entries", "bytes")
+)
+
+# Separates positional from keyword arguments in keys
+_KWARGS_MARK = object()
+
+
+def _make_key(args, kwargs):
+    key = args
+    if kwargs:
+        key += (_KWARGS_MARK,) + tuple(sorted(kwargs.items()))
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
+
+def _sizeof(value):
+    # Deliberately shallow (like sys.getsizeof itself): walking whole object
+    # graphs would cost more than the values are likely to be worth.
+    return sys.getsizeof(value)
+
+
+class _ReplayCache:
+    def __init__(self, max_entries, max_bytes, ttl):
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        # key -> (values, size, expires); least recently used first
+        self._entries = collections.OrderedDict()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+    def get(self, key):
+        entry = self._entries.get(key)
+        if entry is not None:
+            (values, size, expires) = entry
+            if expires is not None and monotonic() >= expires:
+                self._remove(key)
+            else:
+                self._entries.move_to_end(key)
+                self._hits += 1
+                return values
+        self._misses += 1
+        return None
+
+    def fits(self, size):
+        return self.max_bytes is None or size <= self.max_bytes
+
+    def put(self, key, values, size):
+        if key in self._entries:
+            # Someone else made the same call at the same time, and finished
+            # first
+            self._remove(key)
+        expires = None if self.ttl is None else monotonic() + self.ttl
+        self._entries[key] = (values, size, expires)
+        self._bytes += size
+        # Evict the least recently used entries until we're within both
+        # limits
+        while len(self._entries) > self.max_entries:
+            self._remove(next(iter(self._entries)))
+        while not self.fits(self._bytes):
+            self._remove(next(iter(self._entries)))
+
+    def _remove(self, key):
+        (_, size, _) = self._entries.pop(key)
+        self._bytes -= size
+
+    def info(self):
+        return CacheInfo(
+            self._hits, self._misses, len(self._entries), self._bytes
+        )
+
+    def clear(self):
+        self._entries.clear()
+        self._bytes = 0
+        self._hits = 0
+        self._misses = 0
+
+
+@async_generator
+async def _record(cache, key, agen):
+    values = []
+    size = 0
+    async with aclosing(agen):
+        async for value in agen:
+            if values is not None:
+                values.append(value)
+                size += _sizeof(value)
+                if not cache.fits(size):
+                    # Too big to keep, so stop collecting it
+                    values = None
+            await yield_(value)
+    if values is not None:
+        cache.put(key, tuple(values), size)
+
+
+@async_generator
+async def _replay(values):
+    await yield_many_(values)
+
+
+def cached_async_generator(
+        coroutine_maker=None, *, max_entries=128, max_bytes=None, ttl=None
+):
+    if coroutine_maker is None:
+        return partial(
+            cached_async_generator,
+            max_entries=max_entries,
+            max_bytes=max_bytes,
+            ttl=ttl,
+        )
+    if max_entries < 1:
+        raise ValueError("max_entries must be at least 1")
+    if max_bytes is not None and max_bytes < 0:
+        raise ValueError("max_bytes must not be negative")
+    if ttl is not None and ttl <= 0:
+        raise ValueError("ttl must be positive")
+
+    # It can decorate a native async generator function or an
+    # @async_generator one, as well as an async function that uses yield_
+    if isasyncgenfunction(coroutine_maker):
+        agen_maker = coroutine_maker
+    else:
+        agen_maker = async_generator(coroutine_maker)
+    cache = _ReplayCache(max_entries, max_bytes, ttl)
+
+    @wraps(coroutine_maker)
+    def cached_maker(*args, **kwargs):
+        key = _make_key(args, kwargs)
+        if key is None:
+            return agen_maker(*args, **kwargs)
+        values = cache.get(key)
+        if values is not None:
+            return _replay(values)
+        return _record(cache, key, agen_maker(*args, **kwargs))
+
+    cached_maker.cache_info = cache.info
+    cached_maker.cache_clear = cache.clear
+    cached_maker._async_gen_function = id(cached_maker)
+    return cached_maker
+
+
+# disk_cached_async_generator() keeps its entries in files instead, so they
+# survive restarts. There's one directory per decorated function, and one
+# file per entry, named after a hash of the arguments (and the version). A
+# file is:
+#
+#   _FILE_MAGIC
+#   for each value: 8-byte length, then the pickled value
+#   _END_OF_RECORDS (where the next length would be), the number of values,
+#   and _FILE_MAGIC again
+#
+# While a run is being recorded, its values are appended to a temporary file
+# with a unique name, and only a complete one is renamed into place (which is
+# atomic), so a run that crashes halfway never leaves anything behind under
+# the entry's name. On top of that, we check that the records line up exactly
+# with the footer before we serve anything from a file. Hits are read by
+# mapping the file into memory, and unpickling straight out of the mapping.
+
+_FILE_MAGIC = b"AGCACHE1"
+_LENGTH = struct.Struct("<Q")
+_END_OF_RECORDS = 2**64 - 1
+_FOOTER = struct.Struct("<QQ8s")
+# Pinned, so that keys don't change when the default does
+_PICKLE_PROTOCOL = 4
+_ENTRY_SUFFIX = ".entry"
+
+
+def _function_dir(directory, fn):
+    name = "{}.{}".format(
+        getattr(fn, "__module__", None),
+        getattr(fn, "__qualname__", fn.__name__),
+    )
+    # e.g. "<locals>" isn't allowed in file names everywhere
+    return os.path.join(directory, re.sub(r"[^\w.-]", "_", name))
+
+
+class _Unordered(tuple):
+    # Stands in for a set, frozenset or dict in a key: (type name, elements),
+    # with the elements (or items) sorted by their pickles.
+    __slots__ = ()
+
+
+def _normalize(value):
+    # Pickles of equal sets (and dicts) can differ, because their order
+    # depends on the order they were built in, and for sets of strings, on
+    # the per-process hash seed. So we replace them with something that's
+    # in a canonical order, all the way down through the containers that
+    # hold them.
+    cls = type(value)
+    if cls is tuple or cls is list:
+        return cls(_normalize(item) for item in value)
+    if cls is set or cls is frozenset:
+        items = [_normalize(item) for item in value]
+    elif cls is dict:
+        items = [(_normalize(k), _normalize(v)) for (k, v) in value.items()]
+    else:
+        return value
+    items.sort(key=partial(pickle.dumps, protocol=_PICKLE_PROTOCOL))
+    return _Unordered((cls.__name__, tuple(items)))
+
+
+def _entry_path(fn_dir, version, args, kwargs):
+    try:
+        data = pickle.dumps(
+            _normalize((version, args, kwargs)),
+            protocol=_PICKLE_PROTOCOL,
+        )
+    except Exception:
+        # Not picklable, so we can't make a key out of it
+        return None
+    digest = hashlib.sha256(data).hexdigest()
+    return os.path.join(fn_dir, digest + _ENTRY_SUFFIX)
+
+
+def _record_offsets(data):
+    # Returns the (start, end) of every pickled value in a complete entry
+    # file, or None if it isn't one.
+    size = len(data)
+    header = len(_FILE_MAGIC)
+    if size < header + _LENGTH.size + _FOOTER.size:
+        return None
+    if data[:header] != _FILE_MAGIC:
+        return None
+    offsets = []
+    pos = header
+    while True:
+        if pos + _LENGTH.size > size:
+            return None
+        (length,) = _LENGTH.unpack_from(data, pos)
+        pos += _LENGTH.size
+        if length == _END_OF_RECORDS:
+            break
+        if pos + length > size:
+            return None
+        offsets.append((pos, pos + length))
+        pos += length
+    if pos + _FOOTER.size - _LENGTH.size != size:
+        return None
+    (count, magic) = struct.unpack_from("<Q8s", data, pos)
+    if count != len(offsets) or magic != _FILE_MAGIC:
+        return None
+    return offsets
+
+
+def _open_entry(path):
+    # Returns (file, mapping, offsets) for a usable entry, or None
+    try:
+        file = open(path, "rb")
+    except OSError:
+        return None
+    try:
+        mapping = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+    except (OSError, ValueError):
+        # (ValueError: it's empty)
+        file.close()
+        return None
+    offsets = _record_offsets(mapping)
+    if offsets is None:
+        mapping.close()
+        file.close()
+        return None
+    return (file, mapping, offsets)
+
+
+class _EntryWriter:
+    def __init__(self, path):
+        self._path = path
+        fn_dir = os.path.dirname(path)
+        os.makedirs(fn_dir, exist_ok=True)
+        (fd, self._tmp_path) = tempfile.mkstemp(
+            prefix=os.path.basename(path) + ".", suffix=".tmp", dir=fn_dir
+        )
+        self._file = os.fdopen(fd, "wb")
+        self._count = 0
+        self._file.write(_FILE_MAGIC)
+
+    def append(self, value):
+        data = pickle.dumps(value, protocol=_PICKLE_PROTOCOL)
+        self._file.write(_LENGTH.pack(len(data)))
+        self._file.write(data)
+        self._count += 1
+
+    def commit(self):
+        self._file.write(
+            _FOOTER.pack(_END_OF_RECORDS, self._count, _FILE_MAGIC)
+        )
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self._file.close()
+        os.replace(self._tmp_path, self._path)
+
+    def abandon(self):
+        self._file.close()
+        try:
+            os.unlink(self._tmp_path)
+        except OSError:
+            pass
+
+
+@async_generator
+async def _disk_cached(path, agen):
+    entry = _open_entry(path)
+    if entry is not None:
+        await agen.aclose()
+        (file, mapping, offsets) = entry
+        with file, mapping:
+            view = memoryview(mapping)
+            try:
+                for (start, end) in offsets:
+                    with view[start:end] as record:
+                        value = pickle.loads(record)
+                    await yield_(value)
+            finally:
+                # The mapping can't be closed while there are views of it
+                view.release()
+        return
+
+    # Problems with the cache (the disk is full, the values can't be
+    # pickled, ...) mean that this run isn't cached, but they don't stop it.
+    try:
+        writer = _EntryWriter(path)
+    except OSError:
+        writer = None
+    try:
+        async with aclosing(agen):
+            async for value in agen:
+                if writer is not None:
+                    try:
+                        writer.append(value)
+                    except Exception:
+                        writer.abandon()
+                        writer = None
+                await yield_(value)
+    except BaseException:
+        if writer is not None:
+            writer.abandon()
+        raise
+    if writer is not None:
+        try:
+            writer.commit()
+        except OSError:
+            writer.abandon()
+
+
+def disk_cached_async_generator(directory, *, version=0):
+    def decorate(coroutine_maker):
+        if isasyncgenfunction(coroutine_maker):
+            agen_maker = coroutine_maker
+        else:
+            agen_maker = async_generator(coroutine_maker)
+        fn_dir = _function_dir(directory, coroutine_maker)
+
+        @wraps(coroutine_maker)
+        def cached_maker(*args, **kwargs):
+            path = _entry_path(fn_dir, version, args, kwargs)
+            if path is None:
+                return agen_maker(*args, **kwargs)
+            return _disk_cached(path, agen_maker(*args, **kwargs))
+
+        def cache_invalidate(*args, **kwargs):
+            path = _entry_path(fn_dir, version, args, kwargs)
+            if path is not None:
+                try:
+                    os.unlink(path)
+                except FileNotFoundError:
+                    pass
+
+        def cache_clear():
+            # Removes entries from all versions, and temporary files left
+            # behind by crashed runs
+            try:
+                names = os.listdir(fn_dir)
+            except FileNotFoundError:
+                return
+            for name in names:
+                try:
+                    os.unlink(os.path.join(fn_dir, name))
+                except FileNotFoundError:
+                    pass
+
+        cached_maker.cache_invalidate = cache_invalidate
+        cached_maker.cache_clear = cache_clear
+        cached_maker._async_gen_function = id(cached_maker)
+        return cached_maker
+
+    return decorate
@@ -0,0 +1,286 @@
+import collections
+import os
+
+from ._impl import async_generator, yield_, yield_many_, anext_batch
+from ._util import aclosing, asynccontextmanager
+from ._backends import current_backend
+from ._background import serve, Pump, PumpState, VALUE, ERROR, DONE
+
+
+# Helpers that iterate async generators from background tasks. They all
+# follow the same pattern: an 'async with' block owns the tasks (so they work
+# with trio's nurseries as well as asyncio), the tasks pass results to the
+# consumer through queues, and when the block exits, the tasks are cancelled
+# and the source generators are closed from the consumer's task.
+
+# prefetch()'s background task: passes on everything agen does, ending with
+# either an error or DONE.
+async def _produce(agen, queue):
+    try:
+        async for value in agen:
+            await queue.put((VALUE, value))
+    except Exception as exc:
+        await queue.put((ERROR, exc))
+    else:
+        await queue.put((DONE, None))
+
+
+@async_generator
+async def _read(queue, stop):
+    try:
+        while True:
+            (kind, payload) = await queue.get()
+            if kind is DONE:
+                return
+            if kind is ERROR:
+                raise payload
+            if (await yield_(payload)) is not None:
+                # The value we'd send it to was produced long ago
+                raise TypeError(
+                    "can't send non-None value to a prefetched async generator"
+                )
+    finally:
+        stop()
+
+
+@asynccontextmanager
+@async_generator
+async def prefetch(agen, depth=1):
+    async with aclosing(agen):
+        if depth < 1:
+            raise ValueError("depth must be at least 1")
+        backend = current_backend()
+        queue = backend.Queue(depth)
+        async with backend.open_task_group() as group:
+            stop = backend.start_cancellable(group, _produce, agen, queue)
+            try:
+                async with aclosing(_read(queue, stop)) as reader:
+                    await yield_(reader)
+            finally:
+                stop()
+
+
+async def _call(fn, index, value, completions):
+    try:
+        result = await fn(value)
+    except Exception as exc:
+        await completions.put((index, ERROR, exc))
+    else:
+        await completions.put((index, VALUE, result))
+
+
+@async_generator
+async def _amap_results(
+        group, fn, agen, concurrency, ordered, window, completions
+):
+    # In ordered mode, results that arrived ahead of their turn
+    finished = {}
+    next_index = 0
+    next_yield = 0
+    in_flight = 0
+    exhausted = False
+    while True:
+        while (not exhausted and in_flight < concurrency
+               and next_index - next_yield < window):
+            try:
+                value = await agen.__anext__()
+            except StopAsyncIteration:
+                exhausted = True
+                break
+            group.start_soon(_call, fn, next_index, value, completions)
+            next_index += 1
+            in_flight += 1
+        if not in_flight:
+            break
+        (index, kind, payload) = await completions.get()
+        in_flight -= 1
+        if not ordered:
+            next_yield += 1
+            if kind is ERROR:
+                raise payload
+            await yield_(payload)
+            continue
+        finished[index] = (kind, payload)
+        while next_yield in finished:
+            (kind, payload) = finished.pop(next_yield)
+            next_yield += 1
+            if kind is ERROR:
+                raise payload
+            await yield_(payload)
+
+
+@asynccontextmanager
+@async_generator
+async def amap(fn, agen, concurrency=1, ordered=True, window=None):
+    async with aclosing(agen):
+        if concurrency < 1:
+            raise ValueError("concurrency must be at least 1")
+        if window is None:
+            window = 2 * concurrency
+        elif window < concurrency:
+            raise ValueError("window must be at least concurrency")
+        backend = current_backend()
+        # Each call puts exactly one result here, and there are never more
+        # than 'window' calls whose results haven't been taken out yet.
+        completions = backend.Queue(window)
+        async with serve(backend, _amap_results, fn, agen, concurrency,
+                         ordered, window, completions) as results:
+            await yield_(results)
+
+
+# Runs in a worker process. If fn fails partway through the chunk, we still
+# send back the results from before that, so they aren't lost.
+def _map_chunk(fn, items):
+    results = []
+    try:
+        for item in items:
+            results.append(fn(item))
+    except Exception as exc:
+        return (results, exc)
+    return (results, None)
+
+
+async def _wait_chunk(backend, future, index, completions):
+    try:
+        result = await backend.wait_future(future)
+    except Exception as exc:
+        # We couldn't even run it (e.g. fn can't be pickled, or the worker
+        # process died)
+        result = ([], exc)
+    await completions.put((index, result))
+
+
+@async_generator
+async def _aprocess_map_results(
+        group, backend, executor, fn, agen, chunksize, ordered, window,
+        completions
+):
+    # Same bookkeeping as amap(), except that each call handles a whole
+    # chunk of values, and runs in another process.
+    finished = {}
+    next_index = 0
+    next_yield = 0
+    in_flight = 0
+    exhausted = False
+    while True:
+        while not exhausted and next_index - next_yield < window:
+            # This takes whatever the source has ready, up to chunksize, so a
+            # slow source doesn't hold up a chunk waiting for it to fill up.
+            try:
+                items = await anext_batch(agen, chunksize)
+            except StopAsyncIteration:
+                exhausted = True
+                break
+            future = executor.submit(_map_chunk, fn, items)
+            group.start_soon(
+                _wait_chunk, backend, future, next_index, completions
+            )
+            next_index += 1
+            in_flight += 1
+        if not in_flight:
+            break
+        (index, result) = await completions.get()
+        in_flight -= 1
+        if not ordered:
+            next_yield += 1
+            (results, exc) = result
+            await yield_many_(results)
+            if exc is not None:
+                raise exc
+            continue
+        finished[index] = result
+        while next_yield in finished:
+            (results, exc) = finished.pop(next_yield)
+            next_yield += 1
+            await yield_many_(results)
+            if exc is not None:
+                raise exc
+
+
+@asynccontextmanager
+@async_generator
+async def aprocess_map(
+        fn, agen, workers=None, chunksize=16, ordered=True, window=None
+):
+    async with aclosing(agen):
+        if workers is None:
+            workers = os.cpu_count() or 1
+        if workers < 1:
+            raise ValueError("workers must be at least 1")
+        if chunksize < 1:
+            raise ValueError("chunksize must be at least 1")
+        if window is None:
+            window = 2 * workers
+        elif window < 1:
+            raise ValueError("window must be at least 1")
+        from concurrent.futures import ProcessPoolExecutor
+        backend = current_backend()
+        completions = backend.Queue(window)
+        executor = ProcessPoolExecutor(workers)
+        try:
+            async with serve(backend, _aprocess_map_results, backend, executor,
+                             fn, agen, chunksize, ordered, window,
+                             completions) as results:
+                await yield_(results)
+        finally:
+            # Chunks that haven't started yet were cancelled along with
+            # their tasks; any that are running finish in the background.
+            executor.shutdown(wait=False)
+
+
+async def _aclose_all(agens):
+    # Close every one of them, even if closing some of them fails (or we're
+    # cancelled), and then raise the first exception.
+    first_exc = None
+    for agen in agens:
+        try:
+            await agen.aclose()
+        except BaseException as exc:
+            if first_exc is None:
+                first_exc = exc
+    if first_exc is not None:
+        raise first_exc
+
+
+@async_generator
+async def _amerge_results(group, backend, sources, state):
+    for source in sources:
+        group.start_soon(source.pump)
+    while sources:
+        state.ready = backend.Event()
+        # Take one value from the next source in line that has one, and then
+        # move it to the back of the line, so a busy source can't starve the
+        # others.
+        for _ in range(len(sources)):
+            source = sources[0]
+            sources.rotate(-1)
+            if source.buffer:
+                break
+        else:
+            await state.ready.wait()
+            continue
+        (kind, payload) = source.take()
+        if kind is DONE:
+            sources.remove(source)
+        elif kind is ERROR:
+            raise payload
+        else:
+            await yield_(payload)
+
+
+@asynccontextmanager
+@async_generator
+async def amerge(*agens, max_buffer=1):
+    try:
+        if max_buffer < 1:
+            raise ValueError("max_buffer must be at least 1")
+        backend = current_backend()
+        state = PumpState()
+        sources = collections.deque(
+            Pump(backend, agen, max_buffer, state) for agen in agens
+        )
+        async with serve(backend, _amerge_results, backend, sources,
+                         state) as merged:
+            await yield_(merged)
+    finally:
+        await _aclose_all(agens)
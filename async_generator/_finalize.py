@@ -0,0 +1,231 @@
+import collections
+import weakref
+
+from ._impl import (
+    AsyncGenerator,
+    _AG_CLOSED,
+    async_generator,
+    yield_,
+    get_asyncgen_hooks,
+    set_asyncgen_hooks,
+)
+from ._util import asynccontextmanager
+from ._backends import current_backend
+
+# When the GC drops a bunch of async generators at once, the usual finalizer
+# hooks (asyncio's and trio's) start a separate task to aclose() each one.
+# Instead, this finalizer puts them in a queue, and one driver task closes
+# them, with a handful of workers so that at most max_concurrency aclose()s
+# are in flight at once.
+#
+# It also installs a firstiter hook, to keep track of every generator that was
+# started, so that shutdown_asyncgens() can close whatever's left.
+
+ShutdownReport = collections.namedtuple(
+    "ShutdownReport", ("closed", "ignored_exit", "failed", "unfinished")
+)
+
+
+class _BatchFinalizer:
+    def __init__(self, backend, max_concurrency, prev_hooks):
+        self._backend = backend
+        self._max_concurrency = max_concurrency
+        self._prev_firstiter = prev_hooks.firstiter
+        self._prev_finalizer = prev_hooks.finalizer
+        self._alive = weakref.WeakSet()
+        self._queue = collections.deque()
+        self._wakeup = backend.Event()
+        self._wakeup_scheduled = False
+        self._active = True
+
+    def firstiter(self, agen):
+        self._alive.add(agen)
+        if self._prev_firstiter is not None:
+            self._prev_firstiter(agen)
+
+    # This is the hook itself. It's called from __del__, so it can run in
+    # any thread, at any point; all it does is queue agen and make sure the
+    # driver knows.
+    def finalizer(self, agen):
+        if not self._active:
+            # agen was first iterated inside our 'async with', but it
+            # outlived it.
+            _fallback_finalize(self._prev_finalizer, agen)
+            return
+        self._queue.append(agen)
+        if not self._wakeup_scheduled:
+            self._wakeup_scheduled = True
+            self._backend.run_sync_soon(self._wake)
+
+    def _wake(self):
+        self._wakeup.set()
+
+    async def drive(self):
+        while True:
+            await self._wakeup.wait()
+            # Reset before closing, so anything queued from now on wakes us
+            # up again.
+            self._wakeup = self._backend.Event()
+            self._wakeup_scheduled = False
+            await self.close_queued()
+            if not self._active:
+                # Nothing gets queued after this, so one last pass gets
+                # everything
+                await self.close_queued()
+                return
+
+    def stop(self):
+        self._active = False
+        self._wake()
+
+    def abandon_queued(self):
+        while self._queue:
+            agen = self._queue.popleft()
+            try:
+                _fallback_finalize(self._prev_finalizer, agen)
+            except Exception as exc:
+                self._report(agen, exc)
+
+    async def close_queued(self):
+        workers = min(self._max_concurrency, len(self._queue))
+        async with self._backend.open_task_group() as group:
+            for _ in range(workers):
+                group.start_soon(self._worker)
+
+    async def _worker(self):
+        while self._queue:
+            agen = self._queue.popleft()
+            try:
+                await agen.aclose()
+            except Exception as exc:
+                self._report(agen, exc)
+
+    async def shutdown(self, timeout):
+        pending = collections.deque()
+        unfinished = []
+        queued = {id(agen) for agen in self._queue}
+        for agen in list(self._alive):
+            if id(agen) in queued or _is_finished(agen):
+                # The driver will get to it
+                continue
+            if agen.ag_running:
+                # Someone else is in the middle of using it, so we can't
+                # close it
+                unfinished.append(agen)
+            else:
+                pending.append(agen)
+        closing = {}
+        ignored_exit = []
+        failed = []
+        closed = 0
+        workers = min(self._max_concurrency, len(pending))
+
+        async def worker():
+            nonlocal closed, workers
+            while pending:
+                agen = pending.popleft()
+                closing[id(agen)] = agen
+                try:
+                    await agen.aclose()
+                except Exception as exc:
+                    if _ignored_generator_exit(exc):
+                        ignored_exit.append(agen)
+                    else:
+                        failed.append((agen, exc))
+                else:
+                    closed += 1
+                # (If we're cancelled by the deadline, agen stays here.)
+                del closing[id(agen)]
+            workers -= 1
+            if not workers and timeout is not None:
+                # Stop waiting for the deadline
+                group.cancel_scope.cancel()
+
+        async def deadline():
+            await self._backend.sleep(timeout)
+            group.cancel_scope.cancel()
+
+        if workers:
+            async with self._backend.open_task_group() as group:
+                if timeout is not None:
+                    group.start_soon(deadline)
+                for _ in range(workers):
+                    group.start_soon(worker)
+        unfinished.extend(closing.values())
+        unfinished.extend(pending)
+        return ShutdownReport(closed, ignored_exit, failed, unfinished)
+
+    def _report(self, agen, exc):
+        self._backend.report_error(
+            "Exception ignored while finalizing async generator {!r}"
+            .format(agen), exc
+        )
+
+
+def _is_finished(agen):
+    if isinstance(agen, AsyncGenerator):
+        # (This includes ones that ignored GeneratorExit.)
+        return agen._state >= _AG_CLOSED
+    return agen.ag_frame is None
+
+
+def _ignored_generator_exit(exc):
+    # Both native async generators and ours raise this from aclose()
+    return (
+        isinstance(exc, RuntimeError) and "ignored GeneratorExit" in str(exc)
+    )
+
+
+def _fallback_finalize(prev_finalizer, agen):
+    if prev_finalizer is not None:
+        prev_finalizer(agen)
+        return
+    # Same as what happens with no finalizer hook: throw in GeneratorExit,
+    # and complain if the generator doesn't finish in one step.
+    closer = agen.aclose()
+    try:
+        closer.send(None)
+    except StopIteration:
+        pass
+    else:
+        raise RuntimeError(
+            "async generator {!r} awaited during finalization; install a "
+            "finalization hook to support this, or wrap it in 'async with "
+            "aclosing(...):'".format(agen)
+        )
+    finally:
+        closer.close()
+
+
+@asynccontextmanager
+@async_generator
+async def batched_finalizer(max_concurrency=100):
+    if max_concurrency < 1:
+        raise ValueError("max_concurrency must be at least 1")
+    backend = current_backend()
+    old_hooks = get_asyncgen_hooks()
+    finalizer = _BatchFinalizer(backend, max_concurrency, old_hooks)
+    try:
+        async with backend.open_task_group() as group:
+            group.start_soon(finalizer.drive)
+            set_asyncgen_hooks(finalizer.firstiter, finalizer.finalizer)
+            try:
+                await yield_()
+            finally:
+                set_asyncgen_hooks(*old_hooks)
+                finalizer.stop()
+    finally:
+        # If we were cancelled, the driver may not have got to everything.
+        finalizer.abandon_queued()
+
+
+async def shutdown_asyncgens(timeout=None):
+    # We find the generators to close through the firstiter hook, the same
+    # way asyncio's loop.shutdown_asyncgens() does.
+    finalizer = getattr(get_asyncgen_hooks().firstiter, "__self__", None)
+    if not isinstance(finalizer, _BatchFinalizer):
+        raise RuntimeError(
+            "shutdown_asyncgens() must be called inside "
+            "'async with batched_finalizer()'"
+        )
+    return await finalizer.shutdown(timeout)
@@ -1,24 +1,31 @@
 import sys
-from functools import wraps
+from functools import wraps, partial
+from time import perf_counter
 from types import coroutine
 import inspect
-from inspect import (
-    getcoroutinestate, CORO_CREATED, CORO_CLOSED, CORO_SUSPENDED
-)
 import collections.abc
 
 
 class YieldWrapper:
+    __slots__ = ("payload",)
+
     def __init__(self, payload):
         self.payload = payload
 
 
+# A bare 'await yield_()' is very common (e.g. in every @asynccontextmanager),
+# and a box holding None can be shared, so we don't allocate one each time.
+_NONE_BOX = YieldWrapper(None)
+
+
 def _wrap(value):
+    if value is None:
+        return _NONE_BOX
     return YieldWrapper(value)
 
 
 def _is_wrapped(box):
-    return isinstance(box, YieldWrapper)
+    return type(box) is YieldWrapper
 
 
 def _unwrap(box):
@@ -96,7 +103,36 @@ def _unwrap(box):
 # eventually we must bottom out in a @coroutine that calls plain 'yield'.
 @coroutine
 def _yield_(value):
-    return (yield _wrap(value))
+    # This is _wrap(value), inlined because it's on every item's hot path.
+    return (yield _NONE_BOX if value is None else YieldWrapper(value))
+
+
+# yield_many_ uses this to hand a whole batch of values to the AsyncGenerator
+# that's driving us; it then serves them one at a time from its _pending slot.
+class YieldManyWrapper:
+    __slots__ = ("iterator",)
+
+    def __init__(self, iterator):
+        self.iterator = iterator
+
+
+@coroutine
+def _yield_many_(iterator):
+    return (yield YieldManyWrapper(iterator))
+
+
+# yield_from_ uses this to hand a delegate AsyncGenerator to the
+# AsyncGenerator that's driving us; see AsyncGenerator._splice.
+class DelegateWrapper:
+    __slots__ = ("agen",)
+
+    def __init__(self, agen):
+        self.agen = agen
+
+
+@coroutine
+def _splice_(agen):
+    return (yield DelegateWrapper(agen))
 
 
 # But we wrap the bare @coroutine version in an async def, because async def
@@ -106,6 +142,18 @@ async def yield_(value=None):
     return await _yield_(value)
 
 
+# Equivalent to:
+#
+#   for value in iterable:
+#       sent = await yield_(value)
+#   return sent
+#
+# except that the AsyncGenerator driving us answers the __anext__() calls for
+# all of the values without resuming our coroutine in between.
+async def yield_many_(iterable):
+    return await _yield_many_(iter(iterable))
+
+
 async def yield_from_(delegate):
     # Transcribed with adaptations from:
     #
@@ -127,6 +175,14 @@ async def yield_from_(delegate):
     _i = type(delegate).__aiter__(delegate)
     if hasattr(_i, "__await__"):
         _i = await _i
+    if type(_i) is AsyncGenerator and _i._can_splice():
+        # Fast path: rather than re-yielding each item from here, ask the
+        # AsyncGenerator that's driving us to step _i's coroutine directly
+        # until it's finished. That way items, asend() values and athrow()
+        # exceptions go straight to the innermost generator no matter how
+        # deeply yield_from_s are nested, and only _i's return value (or
+        # exception) comes back through here.
+        return await _splice_(_i)
     try:
         _y = await type(_i).__anext__(_i)
     except StopAsyncIteration as _e:
@@ -170,60 +226,226 @@ async def yield_from_(delegate):
 # This is the awaitable / iterator that implements asynciter.__anext__() and
 # friends.
 #
+# Each AsyncGenerator keeps one of these around, and once a step has
+# finished, the same object is handed out again by the next
+# __anext__()/asend()/athrow(). So in the common case where the consumer
+# awaits each step before asking for the next one, iterating allocates no
+# awaitables at all. (If a step is still outstanding -- e.g. someone called
+# asend() twice before awaiting either -- we just make a fresh one.) While
+# it's sitting idle, the cached object doesn't refer back to its generator,
+# so that the generator can still be collected by refcounting alone.
+#
+# We only hand the cached object out again if nobody else refers to it: after
+# 'a = agen.__anext__(); await a; b = agen.__anext__()', reusing it would
+# bring the stale 'a' back to life, and 'await a' would quietly advance the
+# generator instead of raising like it does for native generators. On PyPy,
+# which doesn't have refcounts, we never reuse them.
+#
 # Note: we can be sloppy about the distinction between
 #
-#   type(self._it).__next__(self._it)
+#   type(self._agen._it).send(self._agen._it, value)
 #
 # and
 #
-#   self._it.__next__()
+#   self._agen._it.send(value)
 #
-# because we happen to know that self._it is not a general iterator object,
-# but specifically a coroutine iterator object where these are equivalent.
+# because we happen to know that _it is not a general iterator object, but
+# specifically a coroutine iterator object where these are equivalent.
+
+if hasattr(sys, "getrefcount"):
+    _getrefcount = sys.getrefcount
+else:  # pragma: no cover
+    # Every step looks like it's referenced elsewhere, so none are reused
+    def _getrefcount(obj):
+        return 1
+
+
+# ANextIter._phase values
+_STEP_PENDING = 0  # handed out, but the generator hasn't been entered yet
+_STEP_RUNNING = 1  # the generator is executing (or awaiting) on our behalf
+_STEP_DONE = 2  # finished (or closed)
+
+
 class ANextIter:
-    def __init__(self, it, first_fn, *first_args):
-        self._it = it
-        self._first_fn = first_fn
-        self._first_args = first_args
+    __slots__ = ("_agen", "_phase", "_value", "_throw")
+
+    def __init__(self):
+        self._agen = None
+        self._phase = _STEP_DONE
+        self._value = None
+        self._throw = None
 
     def __await__(self):
         return self
 
-    def __next__(self):
-        if self._first_fn is not None:
-            first_fn = self._first_fn
-            first_args = self._first_args
-            self._first_fn = self._first_args = None
-            return self._invoke(first_fn, *first_args)
-        else:
-            return self._invoke(self._it.__next__)
+    def __iter__(self):
+        return self
+
+    def send(self, value=None):
+        agen = self._agen
+        if self._phase is not _STEP_RUNNING:
+            # This is _begin(), inlined for the common case
+            if self._phase is _STEP_DONE or agen._state > _AG_SUSPENDED:
+                self._begin(agen)
+            agen._state = _AG_RUNNING
+            self._phase = _STEP_RUNNING
+            if self._throw is not None:
+                throw = self._throw
+                self._throw = None
+                agen._pending = None
+                return self._invoke(agen, agen._it.throw, *throw)
+            value = self._value
+            self._value = None
+            if agen._pending is not None:
+                resume = self._pull(agen, agen._pending, value)
+                return self._invoke(agen, *resume)
+        try:
+            result = agen._it.send(value)
+        except BaseException as exc:
+            if agen._delegates:
+                return self._invoke(agen, *agen._unsplice(exc))
+            self._fail(agen, exc)
+        if type(result) is YieldWrapper:
+            # This is _finish(), inlined
+            agen._state = _AG_SUSPENDED
+            self._phase = _STEP_DONE
+            self._agen = None
+            agen._step = self
+            raise StopIteration(result.payload)
+        if type(result) is YieldManyWrapper:
+            resume = self._pull(agen, result.iterator, None)
+            return self._invoke(agen, *resume)
+        if type(result) is DelegateWrapper:
+            agen._splice(result.agen)
+            return self._invoke(agen, agen._it.send, None)
+        return result
 
-    def send(self, value):
-        return self._invoke(self._it.send, value)
+    __next__ = send
 
     def throw(self, type, value=None, traceback=None):
-        return self._invoke(self._it.throw, type, value, traceback)
+        agen = self._agen
+        if self._phase is not _STEP_RUNNING:
+            # Like the native asend() objects, throwing into a step that
+            # hasn't started yet throws straight into the generator.
+            self._begin(agen)
+            self._value = self._throw = None
+            agen._pending = None
+        return self._invoke(agen, agen._it.throw, type, value, traceback)
+
+    def close(self):
+        if self._phase is _STEP_RUNNING:
+            self._agen._state = _AG_SUSPENDED
+        self._phase = _STEP_DONE
+        self._value = self._throw = None
+
+    def _begin(self, agen):
+        if self._phase is _STEP_DONE:
+            raise RuntimeError(
+                "cannot reuse already awaited __anext__()/asend()"
+            )
+        if agen._state > _AG_SUSPENDED:
+            self._phase = _STEP_DONE
+            if agen._state is _AG_RUNNING:
+                raise ValueError("async generator already executing")
+            # Closed or exhausted since this step was created
+            raise StopAsyncIteration()
+        agen._state = _AG_RUNNING
+        self._phase = _STEP_RUNNING
+
+    def _invoke(self, agen, fn, *args):
+        while True:
+            try:
+                result = fn(*args)
+            except BaseException as exc:
+                if not agen._delegates:
+                    self._fail(agen, exc)
+                fn, *args = agen._unsplice(exc)
+                continue
+            if type(result) is YieldWrapper:
+                self._finish(agen)
+                raise StopIteration(result.payload)
+            if type(result) is YieldManyWrapper:
+                fn, *args = self._pull(agen, result.iterator, None)
+            elif type(result) is DelegateWrapper:
+                agen._splice(result.agen)
+                fn, args = agen._it.send, (None,)
+            else:
+                return result
 
-    def _invoke(self, fn, *args):
+    def _pull(self, agen, iterator, value):
+        # Serve the next value from a yield_many_ batch. If the batch is used
+        # up, return the call that resumes the coroutine instead: the last
+        # value sent becomes yield_many_'s return value, and an exception
+        # from the iterator is raised at the yield_many_ call.
         try:
-            result = fn(*args)
-        except StopIteration as e:
+            item = next(iterator)
+        except StopIteration:
+            agen._pending = None
+            return (agen._it.send, value)
+        except BaseException as exc:
+            agen._pending = None
+            return (agen._it.throw, exc)
+        agen._pending = iterator
+        self._finish(agen)
+        raise StopIteration(item)
+
+    def _finish(self, agen):
+        agen._state = _AG_SUSPENDED
+        self._phase = _STEP_DONE
+        # Drop our reference to the generator before going back into its
+        # cache slot, so the two don't form a reference cycle.
+        self._agen = None
+        agen._step = self
+
+    def _fail(self, agen, exc):
+        # Whatever came out of the coroutine, it's finished now.
+        agen._state = _AG_EXHAUSTED
+        self._phase = _STEP_DONE
+        self._agen = None
+        if isinstance(exc, StopIteration):
             # The underlying generator returned, so we should signal the end
             # of iteration.
-            raise StopAsyncIteration(e.value)
-        except StopAsyncIteration as e:
+            agen._pypy_issue2786_workaround.discard(agen._coroutine)
+            raise StopAsyncIteration(exc.value)
+        if isinstance(exc, StopAsyncIteration):
             # PEP 479 says: if a generator raises Stop(Async)Iteration, then
             # it should be wrapped into a RuntimeError. Python automatically
             # enforces this for StopIteration; for StopAsyncIteration we need
             # to it ourselves.
             raise RuntimeError(
                 "async_generator raise StopAsyncIteration"
-            ) from e
-        if _is_wrapped(result):
-            raise StopIteration(_unwrap(result))
-        else:
-            return result
+            ) from exc
+        raise exc
+
 
+class _StepHolder:
+    pass
+
+
+def _measure_idle_step_refs():
+    # What _getrefcount() says about a cached step that only its generator
+    # refers to. Whether the local variable and the argument count as
+    # references depends on the interpreter (newer CPythons borrow them), so
+    # rather than hard-coding the number, we measure it at import time,
+    # loading the step exactly the way AsyncGenerator.__anext__ does.
+    if not hasattr(sys, "getrefcount"):  # pragma: no cover
+        return 0
+    self = _StepHolder()
+    self._step = ANextIter()
+    step = self._step
+    return _getrefcount(step)
+
+
+_IDLE_STEP_REFS = _measure_idle_step_refs()
+
+# AsyncGenerator._state values. These are ordered so that the checks on the
+# hot path are a single comparison.
+_AG_CREATED = 0  # the GC hooks haven't been set up yet
+_AG_READY = 1  # hooks set up, but the coroutine hasn't been entered yet
+_AG_SUSPENDED = 2  # between steps
+_AG_RUNNING = 3  # a step is in progress (or we're spliced into another agen)
+_AG_CLOSED = 4  # aclose() was called, even if it failed to finish us
+_AG_EXHAUSTED = 5  # the coroutine returned or raised
 
 UNSPECIFIED = object()
 try:
@@ -288,13 +510,25 @@ class AsyncGenerator:
     # to iterate the coroutine some more.
     _pypy_issue2786_workaround = set()
 
+    # Overridden by _StatsAsyncGenerator
+    _step_type = ANextIter
+    _stats = None
+
     def __init__(self, coroutine):
         self._coroutine = coroutine
         self._it = coroutine.__await__()
-        self.ag_running = False
+        self._state = _AG_CREATED
         self._finalizer = None
-        self._closed = False
-        self._hooks_inited = False
+        # Cached awaitable for the next step; see ANextIter.
+        self._step = None
+        # While yield_from_ has spliced other AsyncGenerators into us, this
+        # holds one (outer coroutine iterator, delegate) pair per level, and
+        # _it is the innermost delegate's coroutine iterator.
+        self._delegates = []
+        # The rest of a batch passed to yield_many_, if any.
+        self._pending = None
+        # An exception that anext_batch() held back; see _anext_batch.
+        self._deferred_exc = None
 
     # On python 3.5.0 and 3.5.1, __aiter__ must be awaitable.
     # Starting in 3.5.2, it should not be awaitable, and if it is, then it
@@ -324,6 +558,14 @@ class AsyncGenerator:
     def ag_frame(self):
         return self._coroutine.cr_frame
 
+    @property
+    def ag_running(self):
+        return self._state is _AG_RUNNING
+
+    @property
+    def ag_stats(self):
+        return self._stats
+
     ################################################################
     # Core functionality
     ################################################################
@@ -334,59 +576,121 @@ class AsyncGenerator:
     # produces isn't awaited for a bit.
 
     def __anext__(self):
-        return self._do_it(self._it.__next__)
+        # This is _do_it(None, None), inlined because it's the common case
+        if self._state is not _AG_SUSPENDED:
+            self._check_state()
+        step = self._step
+        if step is None or _getrefcount(step) > _IDLE_STEP_REFS:
+            step = self._step_type()
+        self._step = None
+        step._agen = self
+        step._phase = _STEP_PENDING
+        step._value = step._throw = None
+        return step
 
     def asend(self, value):
-        return self._do_it(self._it.send, value)
+        return self._do_it(value, None)
 
     def athrow(self, type, value=None, traceback=None):
-        return self._do_it(self._it.throw, type, value, traceback)
-
-    def _do_it(self, start_fn, *args):
-        if not self._hooks_inited:
-            self._hooks_inited = True
-            (firstiter, self._finalizer) = get_asyncgen_hooks()
-            if firstiter is not None:
-                firstiter(self)
-            if sys.implementation.name == "pypy":
-                self._pypy_issue2786_workaround.add(self._coroutine)
-
-        # On CPython 3.5.2 (but not 3.5.0), coroutines get cranky if you try
-        # to iterate them after they're exhausted. Generators OTOH just raise
-        # StopIteration. We want to convert the one into the other, so we need
-        # to avoid iterating stopped coroutines.
-        if getcoroutinestate(self._coroutine) is CORO_CLOSED:
+        return self._do_it(None, (type, value, traceback))
+
+    def _init_hooks(self):
+        self._state = _AG_READY
+        (firstiter, self._finalizer) = get_asyncgen_hooks()
+        if firstiter is not None:
+            firstiter(self)
+        if sys.implementation.name == "pypy":
+            self._pypy_issue2786_workaround.add(self._coroutine)
+
+    def _do_it(self, value, throw):
+        if self._state is not _AG_SUSPENDED:
+            self._check_state()
+
+        step = self._step
+        if step is None or _getrefcount(step) > _IDLE_STEP_REFS:
+            step = self._step_type()
+        self._step = None
+        step._agen = self
+        step._phase = _STEP_PENDING
+        step._value = value
+        step._throw = throw
+        return step
+
+    def _check_state(self):
+        if self._state is _AG_CREATED:
+            self._init_hooks()
+        elif self._state >= _AG_CLOSED:
+            # On CPython 3.5.2 (but not 3.5.0), coroutines get cranky if you
+            # try to iterate them after they're exhausted. Generators OTOH
+            # just raise StopIteration. We want to convert the one into the
+            # other, so we need to avoid iterating stopped coroutines.
+            if self._deferred_exc is not None:
+                # anext_batch() returned values that came before this
+                exc, self._deferred_exc = self._deferred_exc, None
+                raise exc
             raise StopAsyncIteration()
 
-        async def step():
-            if self.ag_running:
-                raise ValueError("async generator already executing")
-            try:
-                self.ag_running = True
-                return await ANextIter(self._it, start_fn, *args)
-            except StopAsyncIteration:
-                self._pypy_issue2786_workaround.discard(self._coroutine)
-                raise
-            finally:
-                self.ag_running = False
+    def anext_batch(self, max_items):
+        if self._state is _AG_CREATED:
+            self._init_hooks()
+        return _anext_batch_direct(self, max_items)
 
-        return step()
+    def _defer(self, exc):
+        self._deferred_exc = exc
+
+    ################################################################
+    # yield_from_ delegation
+    ################################################################
+
+    def _can_splice(self):
+        # Splicing only takes over our coroutine, so if we're partway
+        # through a yield_many_ batch, or anext_batch() held back an
+        # exception, we have to be iterated the slow way to serve those.
+        return (
+            self._state <= _AG_SUSPENDED and self._pending is None
+            and self._deferred_exc is None
+        )
+
+    def _splice(self, delegate):
+        # Called while one of our steps is running, when the coroutine we're
+        # stepping has done 'await yield_from_(delegate)'. From now on we
+        # step delegate's coroutine ourselves. Like a native 'yield from',
+        # this counts as delegate's first iteration for the purposes of the
+        # GC hooks, and marks delegate as running until it's finished.
+        if delegate._state is _AG_CREATED:
+            delegate._init_hooks()
+        delegate._state = _AG_RUNNING
+        self._delegates.append((self._it, delegate))
+        self._it = delegate._it
+
+    def _unsplice(self, exc):
+        # The innermost delegate finished by raising exc. Pop it, and return
+        # the call that resumes the level above with its result.
+        (self._it, delegate) = self._delegates.pop()
+        delegate._state = _AG_EXHAUSTED
+        self._pypy_issue2786_workaround.discard(delegate._coroutine)
+        if isinstance(exc, StopIteration):
+            return (self._it.send, exc.value)
+        if isinstance(exc, StopAsyncIteration):
+            # See ANextIter._fail
+            new_exc = RuntimeError("async_generator raise StopAsyncIteration")
+            new_exc.__cause__ = exc
+            exc = new_exc
+        return (self._it.throw, exc)
 
     ################################################################
     # Cleanup
     ################################################################
 
     async def aclose(self):
-        state = getcoroutinestate(self._coroutine)
-        if state is CORO_CLOSED or self._closed:
+        self._deferred_exc = None
+        state = self._state
+        if state >= _AG_CLOSED:
             return
-        # Make sure that even if we raise "async_generator ignored
-        # GeneratorExit", and thus fail to exhaust the coroutine,
-        # __del__ doesn't complain again.
-        self._closed = True
-        if state is CORO_CREATED:
+        if state <= _AG_READY:
             # Make sure that aclose() on an unstarted generator returns
             # successfully and prevents future iteration.
+            self._state = _AG_CLOSED
             self._it.close()
             return
         try:
@@ -394,17 +698,27 @@ class AsyncGenerator:
         except (GeneratorExit, StopAsyncIteration):
             self._pypy_issue2786_workaround.discard(self._coroutine)
         else:
+            # Make sure that even though we failed to exhaust the coroutine,
+            # __del__ doesn't complain again.
+            self._state = _AG_CLOSED
             raise RuntimeError("async_generator ignored GeneratorExit")
 
     def __del__(self):
         self._pypy_issue2786_workaround.discard(self._coroutine)
-        if getcoroutinestate(self._coroutine) is CORO_CREATED:
+        state = self._state
+        if state <= _AG_READY:
             # Never started, nothing to clean up, just suppress the "coroutine
             # never awaited" message.
             self._coroutine.close()
-        if getcoroutinestate(self._coroutine
-                             ) is CORO_SUSPENDED and not self._closed:
-            if self._finalizer is not None:
+        elif state is _AG_SUSPENDED:
+            # (Not _AG_RUNNING: if we're still marked as running, then we
+            # were spliced into an outer generator by yield_from_, and
+            # finalizing that generator was also our finalization.)
+            if self._coroutine.cr_frame is None:
+                # The coroutine was in the same reference cycle as us, and
+                # the GC finalized it first, so there's nothing left to do.
+                pass
+            elif self._finalizer is not None:
                 self._finalizer(self)
             else:
                 # Mimic the behavior of native generators on GC with no finalizer:
@@ -428,19 +742,323 @@ class AsyncGenerator:
                     thrower.close()
 
 
+################################################################
+# Runtime statistics
+################################################################
+
+# Generators only pay for statistics if they were created while they were
+# enabled: then they're a _StatsAsyncGenerator, whose steps time themselves.
+# Everything else uses the plain classes above, untouched.
+_stats_enabled = False
+
+
+def enable_stats(enabled=True):
+    global _stats_enabled
+    _stats_enabled = bool(enabled)
+
+
+class AsyncGeneratorStats:
+    __slots__ = (
+        "steps",
+        "yields",
+        "asends",
+        "athrows",
+        "body_time",
+        "suspended_time",
+        "time_to_first_item",
+        "_first_start",
+        "_last_end",
+    )
+
+    def __init__(self):
+        self.steps = 0
+        self.yields = 0
+        self.asends = 0
+        self.athrows = 0
+        self.body_time = 0.0
+        self.suspended_time = 0.0
+        self.time_to_first_item = None
+        self._first_start = None
+        self._last_end = None
+
+    def __repr__(self):
+        return (
+            "<AsyncGeneratorStats steps={} yields={} asends={} athrows={} "
+            "body_time={:.6f} suspended_time={:.6f} time_to_first_item={}>"
+            .format(
+                self.steps, self.yields, self.asends, self.athrows,
+                self.body_time, self.suspended_time, self.time_to_first_item
+            )
+        )
+
+    def _record(self, fn, *args):
+        # fn resumes the generator's body; time it, and the gap since the
+        # last time it ran.
+        start = perf_counter()
+        if self._last_end is None:
+            self._first_start = start
+        else:
+            self.suspended_time += start - self._last_end
+        self.steps += 1
+        try:
+            return fn(*args)
+        except StopIteration:
+            self.yields += 1
+            if self.time_to_first_item is None:
+                self.time_to_first_item = perf_counter() - self._first_start
+            raise
+        finally:
+            self._last_end = perf_counter()
+            self.body_time += self._last_end - start
+
+
+class _StatsANextIter(ANextIter):
+    __slots__ = ()
+
+    def send(self, value=None):
+        if self._agen is None:
+            # Already finished, so this is going to raise
+            return ANextIter.send(self, value)
+        return self._agen._stats._record(ANextIter.send, self, value)
+
+    __next__ = send
+
+    def throw(self, type, value=None, traceback=None):
+        if self._agen is None:
+            return ANextIter.throw(self, type, value, traceback)
+        return self._agen._stats._record(
+            ANextIter.throw, self, type, value, traceback
+        )
+
+
+class _StatsAsyncGenerator(AsyncGenerator):
+    # yield_from_ doesn't splice these into other generators (it checks for
+    # exactly AsyncGenerator), because then we'd never see their steps.
+    _step_type = _StatsANextIter
+
+    def __init__(self, coroutine):
+        super().__init__(coroutine)
+        self._stats = AsyncGeneratorStats()
+
+    def asend(self, value):
+        step = self._do_it(value, None)
+        self._stats.asends += 1
+        return step
+
+    def athrow(self, type, value=None, traceback=None):
+        step = self._do_it(None, (type, value, traceback))
+        self._stats.athrows += 1
+        return step
+
+    def anext_batch(self, max_items):
+        # One step per value, so that they're all counted
+        if self._state is _AG_CREATED:
+            self._init_hooks()
+        return _anext_batch(self.__anext__, max_items, self._defer)
+
+
 if hasattr(collections.abc, "AsyncGenerator"):
     collections.abc.AsyncGenerator.register(AsyncGenerator)
 
+# While track_asyncgens() is on, every new AsyncGenerator is added to this
+# (see _registry.py).
+_registry = None
+
 
-def async_generator(coroutine_maker):
-    @wraps(coroutine_maker)
-    def async_generator_maker(*args, **kwargs):
-        return AsyncGenerator(coroutine_maker(*args, **kwargs))
+def async_generator(coroutine_maker=None, *, native=False, stats=False):
+    if coroutine_maker is None:
+        return partial(async_generator, native=native, stats=stats)
+
+    # Native async generators can't collect statistics, so stats=True wins
+    if native and not stats:
+        from ._native import compile_native
+        native_maker = compile_native(coroutine_maker)
+        if native_maker is not None:
+            return native_maker
+
+    if stats:
+
+        @wraps(coroutine_maker)
+        def async_generator_maker(*args, **kwargs):
+            agen = _StatsAsyncGenerator(coroutine_maker(*args, **kwargs))
+            if _registry is not None:
+                _registry.add(agen)
+            return agen
+    else:
+
+        @wraps(coroutine_maker)
+        def async_generator_maker(*args, **kwargs):
+            if _stats_enabled:
+                agen = _StatsAsyncGenerator(coroutine_maker(*args, **kwargs))
+            else:
+                agen = AsyncGenerator(coroutine_maker(*args, **kwargs))
+            if _registry is not None:
+                _registry.add(agen)
+            return agen
 
     async_generator_maker._async_gen_function = id(async_generator_maker)
     return async_generator_maker
 
 
+# Drives anext() -- a function that returns __anext__() awaitables -- by hand
+# to collect up to max_items values in one await. We keep going for as long
+# as each value arrives without the iterator suspending to the coroutine
+# runner. If it does suspend, we have to pass that through (there's no way to
+# take the step back), but then we stop as soon as that value arrives rather
+# than holding on to the ones we already have any longer.
+#
+# If the iterator raises after we've collected some values, then for our own
+# generators, we return those and call defer(exc) so that the exception is
+# raised by their next __anext__() instead. (That includes
+# StopAsyncIteration, so the return value of an @async_generator isn't
+# lost.) We can't do that for other async iterators (defer is None), so
+# there we raise the exception right away, with the values attached as its
+# 'partial_batch' attribute -- except for StopAsyncIteration, which they'll
+# raise again next time anyway. If it's something like a cancellation that
+# isn't an Exception subclass, we always let it propagate right away.
+@coroutine
+def _anext_batch(anext, max_items, defer):
+    if max_items < 1:
+        raise ValueError("max_items must be at least 1")
+    items = []
+    while len(items) < max_items:
+        suspended = False
+        try:
+            step = anext().__await__()
+            value = None
+            exc = None
+            while True:
+                try:
+                    if exc is None:
+                        trap = step.send(value)
+                    else:
+                        trap = step.throw(exc)
+                except StopIteration as stop:
+                    items.append(stop.value)
+                    break
+                suspended = True
+                try:
+                    value = yield trap
+                    exc = None
+                except BaseException as thrown:
+                    value = None
+                    exc = thrown
+        except (Exception, StopAsyncIteration) as exc:
+            if not items:
+                raise
+            if defer is not None:
+                defer(exc)
+            elif not isinstance(exc, StopAsyncIteration):
+                exc.partial_batch = items
+                raise
+            return items
+        if suspended:
+            break
+    return items
+
+
+# AsyncGenerator.anext_batch() does the same as
+#
+#   _anext_batch(agen.__anext__, max_items, agen._defer)
+#
+# but without paying for a whole step per value: for as long as agen is in
+# the simple case (not running, with nothing spliced in by yield_from_), we
+# resume its coroutine ourselves and collect what it yields, and the values
+# of a yield_many_ batch come straight from its iterator. If the coroutine
+# does anything else -- waits for the coroutine runner, or starts a
+# yield_from_ -- an ANextIter takes over to finish that step, and we stop
+# there like _anext_batch() does.
+@coroutine
+def _anext_batch_direct(agen, max_items):
+    if max_items < 1:
+        raise ValueError("max_items must be at least 1")
+    items = []
+    try:
+        if agen._state is not _AG_SUSPENDED:
+            agen._check_state()
+        while len(items) < max_items:
+            if agen._state > _AG_SUSPENDED or agen._delegates:
+                items += yield from _anext_batch(
+                    agen.__anext__, max_items - len(items), agen._defer
+                )
+                break
+            it = agen._it
+            pending = agen._pending
+            if pending is None:
+                (resume, arg) = (it.send, None)
+            else:
+                # This is ANextIter._pull, for as many values as we want
+                try:
+                    for item in pending:
+                        items.append(item)
+                        if len(items) == max_items:
+                            return items
+                except BaseException as exc:
+                    (resume, arg) = (it.throw, exc)
+                else:
+                    (resume, arg) = (it.send, None)
+                agen._pending = None
+            agen._state = _AG_RUNNING
+            try:
+                result = resume(arg)
+            except BaseException as exc:
+                _running_step(agen)._fail(agen, exc)
+            if type(result) is YieldWrapper:
+                agen._state = _AG_SUSPENDED
+                items.append(result.payload)
+                continue
+            if type(result) is YieldManyWrapper:
+                agen._state = _AG_SUSPENDED
+                agen._pending = result.iterator
+                continue
+            step = _running_step(agen)
+            if type(result) is DelegateWrapper:
+                agen._splice(result.agen)
+                try:
+                    result = step._invoke(agen, agen._it.send, None)
+                except StopIteration as stop:
+                    items.append(stop.value)
+                    continue
+            # The coroutine is waiting for the coroutine runner, so pass that
+            # through until the step finishes
+            while True:
+                try:
+                    value = yield result
+                    exc = None
+                except BaseException as thrown:
+                    value = None
+                    exc = thrown
+                try:
+                    if exc is None:
+                        result = step.send(value)
+                    else:
+                        result = step.throw(exc)
+                except StopIteration as stop:
+                    items.append(stop.value)
+                    break
+            break
+    except (Exception, StopAsyncIteration) as exc:
+        if not items:
+            raise
+        agen._defer(exc)
+    return items
+
+
+def _running_step(agen):
+    # An ANextIter for a step that we've already started by hand
+    step = ANextIter()
+    step._agen = agen
+    step._phase = _STEP_RUNNING
+    return step
+
+
+async def anext_batch(aiter, max_items):
+    if isinstance(aiter, AsyncGenerator):
+        return await aiter.anext_batch(max_items)
+    anext = partial(type(aiter).__anext__, aiter)
+    return await _anext_batch(anext, max_items, None)
+
+
 def isasyncgen(obj):
     if hasattr(inspect, "isasyncgen"):
         if inspect.isasyncgen(obj):
@@ -0,0 +1,379 @@
+import __future__
+import ast
+import builtins
+import inspect
+import sys
+import textwrap
+import types
+from functools import update_wrapper
+
+from ._impl import async_generator, yield_, yield_from_, yield_many_
+
+_OURS = (yield_, yield_from_, yield_many_)
+
+# This implements @async_generator(native=True): on Pythons that have native
+# async generators, we take the source of the decorated function, rewrite
+#
+#   await yield_(x)                 ->  yield x
+#   await yield_from_(agen)         ->  an inlined copy of yield_from_'s loop
+#   target = await yield_from_(agen)
+#   await yield_many_(iterable)     ->  a for loop that yields each value
+#   target = await yield_many_(iterable)
+#
+# and compile the result into a real async generator function. Anything we're
+# not 100% sure how to handle makes us give up, and then the caller falls
+# back on the regular AsyncGenerator wrapper.
+
+# Builtins that the inlined yield_from_ loop refers to. If the function or its
+# module rebinds any of these, we don't try to be clever.
+_LOOP_BUILTINS = {
+    "type",
+    "hasattr",
+    "getattr",
+    "BaseException",
+    "GeneratorExit",
+    "StopAsyncIteration",
+}
+
+# The formal semantics of yield_from_, transcribed as statements. {n} makes
+# the names unique per call site, and __ag_delegate is replaced by the
+# argument expression. This has to stay in sync with yield_from_ itself.
+_YIELD_FROM_TEMPLATE = """
+__ag_d{n} = __ag_delegate
+__ag_i{n} = type(__ag_d{n}).__aiter__(__ag_d{n})
+if hasattr(__ag_i{n}, "__await__"):
+    __ag_i{n} = await __ag_i{n}
+__ag_r{n} = None
+try:
+    __ag_y{n} = await type(__ag_i{n}).__anext__(__ag_i{n})
+except StopAsyncIteration as __ag_e{n}:
+    if __ag_e{n}.args:
+        __ag_r{n} = __ag_e{n}.args[0]
+else:
+    while True:
+        try:
+            __ag_s{n} = yield __ag_y{n}
+        except GeneratorExit:
+            __ag_m{n} = getattr(__ag_i{n}, "aclose", None)
+            if __ag_m{n} is not None:
+                await __ag_m{n}()
+            raise
+        except BaseException as __ag_e{n}:
+            __ag_m{n} = getattr(__ag_i{n}, "athrow", None)
+            if __ag_m{n} is None:
+                raise
+            try:
+                __ag_y{n} = await __ag_m{n}(
+                    type(__ag_e{n}), __ag_e{n}, __ag_e{n}.__traceback__
+                )
+            except StopAsyncIteration as __ag_x{n}:
+                if __ag_x{n}.args:
+                    __ag_r{n} = __ag_x{n}.args[0]
+                break
+        else:
+            try:
+                if __ag_s{n} is None:
+                    __ag_y{n} = await type(__ag_i{n}).__anext__(__ag_i{n})
+                else:
+                    __ag_y{n} = await __ag_i{n}.asend(__ag_s{n})
+            except StopAsyncIteration as __ag_e{n}:
+                if __ag_e{n}.args:
+                    __ag_r{n} = __ag_e{n}.args[0]
+                break
+__ag_d{n} = __ag_i{n} = __ag_y{n} = __ag_s{n} = __ag_m{n} = None
+"""
+
+_YIELD_MANY_TEMPLATE = """
+__ag_r{n} = None
+for __ag_v{n} in __ag_delegate:
+    __ag_r{n} = yield __ag_v{n}
+__ag_v{n} = None
+"""
+
+
+class _CannotRewrite(Exception):
+    pass
+
+
+class _SubstituteDelegate(ast.NodeTransformer):
+    def __init__(self, delegate):
+        self._delegate = delegate
+
+    def visit_Name(self, node):
+        if node.id == "__ag_delegate":
+            return self._delegate
+        return node
+
+
+class _Rewriter(ast.NodeTransformer):
+    def __init__(self, namespace):
+        self._namespace = namespace
+        self.yields = 0
+        self._sites = 0
+
+    def _resolve(self, node):
+        if isinstance(node, ast.Name):
+            return self._namespace.get(node.id)
+        if isinstance(node, ast.Attribute):
+            try:
+                return getattr(self._resolve(node.value), node.attr, None)
+            except Exception:
+                return None
+        return None
+
+    def _is_call_to(self, node, fn):
+        return (
+            isinstance(node, ast.Await) and isinstance(node.value, ast.Call)
+            and self._resolve(node.value.func) is fn
+        )
+
+    def _mentions_ours(self, node):
+        for child in ast.walk(node):
+            if isinstance(child, (ast.Name, ast.Attribute)):
+                if self._resolve(child) in _OURS:
+                    return True
+        return False
+
+    def _is_async_generator_decorator(self, node):
+        if isinstance(node, ast.Call):
+            node = node.func
+        return self._resolve(node) is async_generator
+
+    # Nested scopes are left alone. But if they use any of our yield_*s,
+    # then either they're @async_generators themselves (fine), or they might
+    # be helpers that yield on our behalf, which only works under emulation.
+    def _visit_nested_def(self, node):
+        if any(map(self._is_async_generator_decorator, node.decorator_list)):
+            return node
+        if self._mentions_ours(node):
+            raise _CannotRewrite
+        return node
+
+    visit_FunctionDef = _visit_nested_def
+    visit_AsyncFunctionDef = _visit_nested_def
+
+    def visit_Lambda(self, node):
+        if self._mentions_ours(node):
+            raise _CannotRewrite
+        return node
+
+    def visit_ClassDef(self, node):
+        if self._mentions_ours(node):
+            raise _CannotRewrite
+        return node
+
+    def visit_Await(self, node):
+        if self._is_call_to(node, yield_):
+            call = node.value
+            if len(call.args) + len(call.keywords) > 1:
+                raise _CannotRewrite
+            if call.args:
+                value = call.args[0]
+                if isinstance(value, ast.Starred):
+                    raise _CannotRewrite
+            elif call.keywords:
+                if call.keywords[0].arg != "value":
+                    raise _CannotRewrite
+                value = call.keywords[0].value
+            else:
+                value = None
+            if value is not None:
+                value = self.visit(value)
+            self.yields += 1
+            return ast.copy_location(ast.Yield(value=value), node)
+        return self.generic_visit(node)
+
+    def _inline(self, template, node, target):
+        call = node.value
+        if len(call.args) != 1 or call.keywords:
+            raise _CannotRewrite
+        if isinstance(call.args[0], ast.Starred):
+            raise _CannotRewrite
+        delegate = self.visit(call.args[0])
+        n = self._sites
+        self._sites += 1
+        self.yields += 1
+        body = ast.parse(template.format(n=n)).body
+        body = [_SubstituteDelegate(delegate).visit(stmt) for stmt in body]
+        if target is not None:
+            result = ast.Name(id="__ag_r{}".format(n), ctx=ast.Load())
+            body.append(ast.Assign(targets=target, value=result))
+        for stmt in body:
+            for child in ast.walk(stmt):
+                if "lineno" in child._attributes:
+                    ast.copy_location(child, node)
+        return body
+
+    def _template_for(self, node):
+        if self._is_call_to(node, yield_from_):
+            return _YIELD_FROM_TEMPLATE
+        if self._is_call_to(node, yield_many_):
+            return _YIELD_MANY_TEMPLATE
+        return None
+
+    def visit_Expr(self, node):
+        template = self._template_for(node.value)
+        if template is not None:
+            return self._inline(template, node.value, None)
+        return self.generic_visit(node)
+
+    def visit_Assign(self, node):
+        template = self._template_for(node.value)
+        if template is not None:
+            targets = [self.visit(target) for target in node.targets]
+            return self._inline(template, node.value, targets)
+        return self.generic_visit(node)
+
+    def visit_Name(self, node):
+        # Any use of yield_/yield_from_/yield_many_ that we didn't rewrite
+        if self._resolve(node) in _OURS:
+            raise _CannotRewrite
+        return node
+
+    def visit_Attribute(self, node):
+        if self._resolve(node) in _OURS:
+            raise _CannotRewrite
+        return self.generic_visit(node)
+
+
+def _find_def(tree, name):
+    if len(tree.body) != 1:
+        return None
+    node = tree.body[0]
+    if not isinstance(node, ast.AsyncFunctionDef) or node.name != name:
+        return None
+    return node
+
+
+def _uses_private_names(node):
+    # These would have been mangled if the function was defined in a class
+    # body, and we compile outside of any class.
+    for child in ast.walk(node):
+        name = getattr(child, "id", None) or getattr(child, "attr", None)
+        if not isinstance(name, str):
+            continue
+        if name.startswith("__") and not name.endswith("__"):
+            return True
+    return False
+
+
+def _future_flags(code):
+    flags = 0
+    for feature in __future__.all_feature_names:
+        flag = getattr(__future__, feature).compiler_flag
+        if code.co_flags & flag:
+            flags |= flag
+    return flags
+
+
+# Rewrites an 'async def' written for @async_generator into a native async
+# generator function, or returns None if we can't do that safely.
+def compile_native(fn):
+    if sys.version_info < (3, 6) or not hasattr(inspect, "CO_ASYNC_GENERATOR"):
+        return None
+    if type(fn) is not types.FunctionType:
+        return None
+    if not inspect.iscoroutinefunction(fn) or hasattr(fn, "__wrapped__"):
+        return None
+    code = fn.__code__
+    if "__class__" in code.co_freevars:
+        # Zero-argument super() needs the class cell set up by a class body.
+        return None
+    try:
+        source = textwrap.dedent(inspect.getsource(fn))
+        tree = ast.parse(source)
+    except (OSError, TypeError, SyntaxError):
+        return None
+    funcdef = _find_def(tree, fn.__name__)
+    if funcdef is None or _uses_private_names(funcdef):
+        return None
+
+    closure = fn.__closure__ or ()
+    namespace = dict(vars(builtins))
+    namespace.update(fn.__globals__)
+    for name, cell in zip(code.co_freevars, closure):
+        try:
+            namespace[name] = cell.cell_contents
+        except ValueError:
+            namespace.pop(name, None)
+    for name in _LOOP_BUILTINS:
+        if namespace.get(name) is not getattr(builtins, name):
+            return None
+    for node in ast.walk(funcdef):
+        if isinstance(node, ast.Name) and node.id in _LOOP_BUILTINS:
+            if not isinstance(node.ctx, ast.Load):
+                return None
+        if isinstance(node, ast.arg) and node.arg in _LOOP_BUILTINS:
+            return None
+
+    # We must be the innermost decorator (if any), so that dropping the
+    # decorators doesn't drop anything that was applied before us.
+    if funcdef.decorator_list:
+        rewriter = _Rewriter(namespace)
+        decorator = funcdef.decorator_list[-1]
+        if not rewriter._is_async_generator_decorator(decorator):
+            return None
+    funcdef.decorator_list = []
+
+    rewriter = _Rewriter(namespace)
+    try:
+        funcdef.body = [
+            new for stmt in funcdef.body
+            for new in _as_list(rewriter.visit(stmt))
+        ]
+    except _CannotRewrite:
+        return None
+    if not rewriter.yields:
+        # Without any yields, the native version would be a plain coroutine
+        return None
+    ast.increment_lineno(funcdef, code.co_firstlineno - 1)
+
+    # Compile inside a factory function whose arguments are our free
+    # variables, so the inner code object has matching co_freevars and we
+    # can reuse the original closure cells.
+    factory = ast.parse(
+        "def __ag_factory({}):\n    pass\n".format(
+            ", ".join(code.co_freevars)
+        )
+    )
+    factory.body[0].body = [funcdef]
+    ast.fix_missing_locations(factory)
+    try:
+        module_code = compile(
+            factory,
+            code.co_filename,
+            "exec",
+            flags=_future_flags(code),
+            dont_inherit=True
+        )
+    except SyntaxError:
+        # e.g. 'return value' is not allowed in a native async generator
+        return None
+    factory_code = _find_code(module_code, "__ag_factory")
+    new_code = _find_code(factory_code, fn.__name__)
+    if not new_code.co_flags & inspect.CO_ASYNC_GENERATOR:
+        return None
+    cells = dict(zip(code.co_freevars, closure))
+    try:
+        new_closure = tuple(cells[name] for name in new_code.co_freevars)
+    except KeyError:
+        return None
+
+    native = types.FunctionType(
+        new_code, fn.__globals__, fn.__name__, fn.__defaults__, new_closure
+    )
+    native.__kwdefaults__ = fn.__kwdefaults__
+    return update_wrapper(native, fn)
+
+
+def _as_list(node):
+    if isinstance(node, list):
+        return node
+    return [node]
+
+
+def _find_code(code, name):
+    for const in code.co_consts:
+        if isinstance(const, types.CodeType) and const.co_name == name:
+            return const
+    raise AssertionError("compiled code went missing")
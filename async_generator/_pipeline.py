@@ -0,0 +1,199 @@
+from ._impl import async_generator, yield_, yield_many_
+from ._util import aclosing
+
+# pipeline() chains stages onto an async generator. A chain of separate
+# @async_generator stages costs one trip through each of them for every item,
+# so instead, runs of adjacent synchronous stages (the ones made by
+# pipeline.map(), pipeline.filter(), etc.) are fused into a single async
+# generator, which passes each item from the source through all of them with
+# plain function calls.
+#
+# To make that possible, a synchronous stage is "push" style: its compile()
+# method, given the function that feeds the next stage, returns the function
+# that feeds it. Feeding a stage returns False once it won't accept any more items
+# (e.g. islice() has reached its stop), so that we can stop pulling items
+# from the source.
+
+
+class _SyncStage:
+    __slots__ = ()
+
+    # True for stages that won't accept any items at all
+    exhausted = False
+
+
+class _Map(_SyncStage):
+    __slots__ = ("fn",)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def compile(self, downstream):
+        fn = self.fn
+
+        def push(item):
+            return downstream(fn(item))
+
+        return push
+
+
+class _Filter(_SyncStage):
+    __slots__ = ("predicate",)
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def compile(self, downstream):
+        predicate = self.predicate
+
+        def push(item):
+            if predicate(item):
+                return downstream(item)
+            return True
+
+        return push
+
+
+class _TakeWhile(_SyncStage):
+    __slots__ = ("predicate",)
+
+    def __init__(self, predicate):
+        self.predicate = predicate
+
+    def compile(self, downstream):
+        predicate = self.predicate
+
+        def push(item):
+            if predicate(item):
+                return downstream(item)
+            return False
+
+        return push
+
+
+class _ISlice(_SyncStage):
+    __slots__ = ("start", "stop", "step")
+
+    def __init__(self, *args):
+        s = slice(*args)
+        self.start = 0 if s.start is None else s.start
+        self.stop = s.stop
+        self.step = 1 if s.step is None else s.step
+        if self.start < 0 or (self.stop is not None and self.stop < 0):
+            raise ValueError("indices for islice() must be None or >= 0")
+        if self.step < 1:
+            raise ValueError("step for islice() must be a positive integer")
+
+    @property
+    def exhausted(self):
+        return self.stop == 0
+
+    def compile(self, downstream):
+        start = self.start
+        stop = self.stop
+        step = self.step
+        index = 0
+
+        def push(item):
+            nonlocal index
+            current = index
+            index += 1
+            if current >= start and (current - start) % step == 0:
+                if not downstream(item):
+                    return False
+            # Don't ask for any more items if we won't use them
+            return stop is None or index < stop
+
+        return push
+
+
+class _Enumerate(_SyncStage):
+    __slots__ = ("start",)
+
+    def __init__(self, start=0):
+        self.start = start
+
+    def compile(self, downstream):
+        index = self.start
+
+        def push(item):
+            nonlocal index
+            current = index
+            index += 1
+            return downstream((current, item))
+
+        return push
+
+
+class _FlatMap(_SyncStage):
+    __slots__ = ("fn",)
+
+    def __init__(self, fn):
+        self.fn = fn
+
+    def compile(self, downstream):
+        fn = self.fn
+
+        def push(item):
+            for value in fn(item):
+                if not downstream(value):
+                    return False
+            return True
+
+        return push
+
+
+def _push_to(outputs):
+    append = outputs.append
+
+    def push(item):
+        append(item)
+        return True
+
+    return push
+
+
+@async_generator
+async def _fused(source, stages):
+    outputs = []
+    push = _push_to(outputs)
+    for stage in reversed(stages):
+        push = stage.compile(push)
+    async with aclosing(source):
+        if any(stage.exhausted for stage in stages):
+            return
+        async for item in source:
+            more = push(item)
+            if len(outputs) == 1:
+                await yield_(outputs.pop())
+            elif outputs:
+                # This serves all of them without resuming us in between, and
+                # we only get back here after the last one was taken, so we
+                # can reuse the list.
+                await yield_many_(outputs)
+                outputs.clear()
+            if not more:
+                return
+
+
+def pipeline(source, *stages):
+    fused = []
+    for stage in stages:
+        if isinstance(stage, _SyncStage):
+            fused.append(stage)
+            continue
+        if fused:
+            source = _fused(source, fused)
+            fused = []
+        source = stage(source)
+    if fused:
+        source = _fused(source, fused)
+    return source
+
+
+pipeline.map = _Map
+pipeline.filter = _Filter
+pipeline.takewhile = _TakeWhile
+pipeline.islice = _ISlice
+pipeline.enumerate = _Enumerate
+pipeline.flat_map = _FlatMap
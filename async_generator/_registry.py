@@ -0,0 +1,130 @@
+import collections
+import random
+import sys
+import traceback
+import weakref
+
+from . import _impl
+
+# This is for tracking down leaks: while it's on, every AsyncGenerator that's
+# created is remembered (weakly), so you can ask which @async_generator
+# functions have lots of generators alive, what state they're in, and where
+# they were created.
+
+AsyncGeneratorCensus = collections.namedtuple(
+    "AsyncGeneratorCensus",
+    ("code", "count", "states", "locals_size", "tracebacks"),
+)
+
+_STATE_NAMES = {
+    _impl._AG_CREATED: "created",
+    _impl._AG_READY: "created",
+    _impl._AG_SUSPENDED: "suspended",
+    _impl._AG_RUNNING: "running",
+    _impl._AG_CLOSED: "closed",
+    _impl._AG_EXHAUSTED: "closed",
+}
+
+# Frames in these modules are skipped when recording where a generator was
+# created.
+_OUR_MODULES = {__name__, _impl.__name__}
+
+
+class _Registry:
+    def __init__(self, traceback_rate, traceback_limit):
+        self._traceback_rate = traceback_rate
+        self._traceback_limit = traceback_limit
+        # ag_code -> WeakSet of the generators running it
+        self._live = {}
+        # generator -> StackSummary, for the ones we sampled
+        self._tracebacks = weakref.WeakKeyDictionary()
+
+    def add(self, agen):
+        code = agen.ag_code
+        try:
+            live = self._live[code]
+        except KeyError:
+            live = self._live[code] = weakref.WeakSet()
+        live.add(agen)
+        if self._traceback_rate and random.random() < self._traceback_rate:
+            frame = sys._getframe(1)
+            while frame.f_globals.get("__name__") in _OUR_MODULES:
+                frame = frame.f_back
+            self._tracebacks[agen] = traceback.extract_stack(
+                frame, limit=self._traceback_limit
+            )
+
+    def census(self):
+        result = []
+        for code, live in list(self._live.items()):
+            agens = list(live)
+            if not agens:
+                del self._live[code]
+                continue
+            states = collections.Counter()
+            locals_size = 0
+            tracebacks = []
+            for agen in agens:
+                states[_STATE_NAMES[agen._state]] += 1
+                locals_size += _frame_size(agen.ag_frame)
+                stack = self._tracebacks.get(agen)
+                if stack is not None:
+                    tracebacks.append(stack)
+            result.append(
+                AsyncGeneratorCensus(
+                    code, len(agens), dict(states), locals_size, tracebacks
+                )
+            )
+        result.sort(key=lambda entry: entry.count, reverse=True)
+        return result
+
+
+def _frame_size(frame):
+    # Approximate: the frame itself, plus the shallow size of each distinct
+    # object its locals refer to.
+    if frame is None:
+        return 0
+    size = sys.getsizeof(frame)
+    seen = set()
+    for value in frame.f_locals.values():
+        if id(value) not in seen:
+            seen.add(id(value))
+            size += sys.getsizeof(value)
+    return size
+
+
+def track_asyncgens(enabled=True, *, traceback_rate=0.0, traceback_limit=10):
+    if not 0 <= traceback_rate <= 1:
+        raise ValueError("traceback_rate must be between 0 and 1")
+    if enabled:
+        _impl._registry = _Registry(traceback_rate, traceback_limit)
+    else:
+        _impl._registry = None
+
+
+def asyncgen_census():
+    registry = _impl._registry
+    if registry is None:
+        raise RuntimeError("call track_asyncgens() first")
+    return registry.census()
+
+
+def format_asyncgen_census(limit=10):
+    lines = []
+    for entry in asyncgen_census()[:limit]:
+        code = entry.code
+        states = ", ".join(
+            "{} {}".format(count, state)
+            for (state, count) in sorted(entry.states.items())
+        )
+        lines.append(
+            "{} ({}:{}): {} alive ({}), ~{} bytes of locals\n".format(
+                code.co_name, code.co_filename, code.co_firstlineno,
+                entry.count, states, entry.locals_size
+            )
+        )
+        if entry.tracebacks:
+            lines.append("  Created at (sample):\n")
+            for line in entry.tracebacks[0].format():
+                lines.append("  " + line.replace("\n", "\n  ").rstrip(" "))
+    return "".join(lines)
@@ -0,0 +1,220 @@
+import collections
+import threading
+
+from ._impl import anext_batch
+
+# iterate_sync() drives an async generator from synchronous code, by calling
+# send() on its steps ourselves, the way a coroutine runner would. That works
+# as long as the generator never needs the runner for anything: a bare
+# 'yield' from the bottom of the await stack (e.g. asyncio.sleep(0)) just
+# asks to be resumed later, so we resume it right away, but anything else
+# (a Future, one of trio's traps, ...) is something only a real event loop can
+# handle.
+
+
+def _run_sync(awaitable):
+    it = awaitable.__await__()
+    value = None
+    exc = None
+    while True:
+        try:
+            if exc is None:
+                trap = it.send(value)
+            else:
+                trap = it.throw(exc)
+        except StopIteration as stop:
+            return stop.value
+        if trap is None and exc is None:
+            continue
+        if exc is not None:
+            # We already raised an error at the first suspension, and it
+            # suspended again instead of letting it propagate
+            it.close()
+            raise exc
+        # Raise it at the point where it suspended, so that the generator's
+        # 'finally' blocks (and any 'async with' blocks) run, and we get a
+        # traceback pointing at the await that caused it.
+        exc = RuntimeError(
+            "iterate_sync() can't run an async generator that suspends on "
+            "{!r}; that needs an event loop".format(trap)
+        )
+
+
+def iterate_sync(agen):
+    # Like yield_from_, this forwards send(), throw() and close() to the
+    # async generator's asend(), athrow() and aclose().
+    step = agen.__anext__()
+    try:
+        while True:
+            try:
+                value = _run_sync(step)
+            except StopAsyncIteration:
+                return
+            try:
+                sent = yield value
+            except GeneratorExit:
+                raise
+            except BaseException as exc:
+                step = agen.athrow(type(exc), exc, exc.__traceback__)
+            else:
+                if sent is None:
+                    step = agen.__anext__()
+                else:
+                    step = agen.asend(sent)
+    finally:
+        _run_sync(agen.aclose())
+
+
+# to_sync_iter() is the other way around: the generator needs a real event
+# loop, so we run one (asyncio, shared by all of them) in a background
+# thread. Each generator gets a task there that pulls values out of it and
+# into a buffer, with anext_batch() so it takes whatever's ready in one go,
+# and the consuming thread swaps out the whole buffer at once, so the two
+# threads only have to synchronize once per batch instead of once per value.
+
+_shared_loop = None
+_shared_loop_thread = None
+_shared_loop_lock = threading.Lock()
+
+
+def _get_shared_loop():
+    global _shared_loop, _shared_loop_thread
+    with _shared_loop_lock:
+        if _shared_loop is None:
+            import asyncio
+            loop = asyncio.new_event_loop()
+            thread = threading.Thread(
+                target=loop.run_forever,
+                name="async_generator.to_sync_iter",
+                daemon=True,
+            )
+            thread.start()
+            _shared_loop = loop
+            _shared_loop_thread = thread
+        return _shared_loop
+
+
+class _Bridge:
+    def __init__(self, agen, prefetch):
+        self._agen = agen
+        self._prefetch = prefetch
+        self._loop = None
+        self._cond = threading.Condition(threading.Lock())
+        # Everything from here down is protected by _cond
+        self._buffer = collections.deque()
+        self._space = None
+        self._waiting_for_space = False
+        self._finished = False
+        self._exc = None
+        self._close_exc = None
+        # These are only touched in the loop thread
+        self._task = None
+        self._close_requested = False
+
+    def next_batch(self):
+        # Returns a deque of values, which is empty once we're finished.
+        if threading.current_thread() is _shared_loop_thread:
+            raise RuntimeError(
+                "can't iterate to_sync_iter() from inside its own event loop"
+            )
+        if self._loop is None:
+            self._loop = _get_shared_loop()
+            self._loop.call_soon_threadsafe(self._start)
+        with self._cond:
+            while not self._buffer and not self._finished:
+                self._cond.wait()
+            batch = self._buffer
+            self._buffer = collections.deque()
+            wake = self._waiting_for_space
+            self._waiting_for_space = False
+            if not batch:
+                (exc, self._exc) = (self._exc, None)
+                if exc is not None:
+                    raise exc
+        if wake:
+            self._loop.call_soon_threadsafe(self._space.set)
+        return batch
+
+    def _start(self):
+        self._task = self._loop.create_task(self._pump())
+
+    async def _pump(self):
+        import asyncio
+        try:
+            while not self._close_requested:
+                with self._cond:
+                    space = self._prefetch - len(self._buffer)
+                    if space <= 0:
+                        self._space = asyncio.Event()
+                        self._waiting_for_space = True
+                if space <= 0:
+                    await self._space.wait()
+                    continue
+                batch = await anext_batch(self._agen, space)
+                with self._cond:
+                    self._buffer.extend(batch)
+                    self._cond.notify()
+        except StopAsyncIteration:
+            pass
+        except asyncio.CancelledError:
+            # close() did that
+            pass
+        except Exception as exc:
+            with self._cond:
+                # (Values from before the exception go first)
+                self._buffer.extend(getattr(exc, "partial_batch", ()))
+                self._exc = exc
+        finally:
+            try:
+                await self._agen.aclose()
+            except Exception as exc:
+                with self._cond:
+                    self._close_exc = exc
+            with self._cond:
+                self._finished = True
+                self._cond.notify_all()
+
+    def _cancel(self):
+        self._close_requested = True
+        if self._task is not None:
+            # (If it hasn't started yet, cancelling it would mean its
+            # 'finally' block never runs. It'll see _close_requested
+            # instead.)
+            self._task.cancel()
+
+    def close(self):
+        if self._loop is None:
+            # Never started, so just close it
+            self._loop = _get_shared_loop()
+            self._loop.call_soon_threadsafe(self._start_closed)
+        else:
+            self._loop.call_soon_threadsafe(self._cancel)
+        if threading.current_thread() is _shared_loop_thread:
+            # We're being garbage collected in the loop thread, so we can't
+            # wait for it
+            return
+        with self._cond:
+            while not self._finished:
+                self._cond.wait()
+            (exc, self._close_exc) = (self._close_exc, None)
+        if exc is not None:
+            raise exc
+
+    def _start_closed(self):
+        self._close_requested = True
+        self._start()
+
+
+def to_sync_iter(agen, prefetch=64):
+    bridge = _Bridge(agen, prefetch)
+    try:
+        if prefetch < 1:
+            raise ValueError("prefetch must be at least 1")
+        while True:
+            batch = bridge.next_batch()
+            if not batch:
+                return
+            for value in batch:
+                yield value
+    finally:
+        bridge.close()
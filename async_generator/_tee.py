@@ -0,0 +1,144 @@
+from ._impl import AsyncGenerator, _AG_READY, yield_
+from ._backends import current_backend
+
+# atee() hands out n consumer generators that share one ring buffer. Item i
+# of the source lives in _ring[i % max_buffer] from when it's fetched until
+# every consumer has moved past it. Each consumer just has a cursor (the
+# index of the next item it wants), and whichever consumer gets to the head
+# first fetches the next item from the source for everyone. If that would
+# overwrite an item the slowest consumer hasn't seen yet, it waits instead.
+#
+# Waiting needs an Event from the async library, but we only look for one
+# when somebody actually has to wait, so consumers that stay within
+# max_buffer of each other work anywhere.
+
+_FINISHED = object()
+
+
+class _Tee:
+    def __init__(self, agen, n, max_buffer):
+        self._agen = agen
+        self._ring = [None] * max_buffer
+        self._head = 0
+        self._tail = 0
+        # Consumers that have finished are taken out of here, so they don't
+        # hold the others back.
+        self._cursors = dict.fromkeys(range(n), 0)
+        self._fetching = False
+        # Set to an exception (or _FINISHED) when the source is done
+        self._outcome = None
+        self._backend = None
+        self._changed = None
+
+    async def _wait(self):
+        if self._changed is None:
+            if self._backend is None:
+                self._backend = current_backend()
+            self._changed = self._backend.Event()
+        await self._changed.wait()
+
+    def _notify(self):
+        if self._changed is not None:
+            self._changed.set()
+            self._changed = None
+
+    async def _fetch(self):
+        self._fetching = True
+        try:
+            value = await self._agen.__anext__()
+        except StopAsyncIteration:
+            self._outcome = _FINISHED
+        except Exception as exc:
+            self._outcome = exc
+        except BaseException as exc:
+            # We were cancelled (or interrupted) in the middle of the fetch.
+            # That went through the source too, so it's finished, but the
+            # other consumers mustn't think it finished cleanly -- and it's
+            # not theirs to raise, so they get an error of their own.
+            self._outcome = RuntimeError("atee() source was interrupted")
+            self._outcome.__cause__ = exc
+            raise
+        else:
+            self._ring[self._head % len(self._ring)] = value
+            self._head += 1
+        finally:
+            self._fetching = False
+            self._notify()
+
+    def _advance(self, index):
+        # Someone just took item 'index'; if that was the last consumer
+        # holding on to the oldest item(s), free them.
+        if index != self._tail:
+            return
+        tail = min(self._cursors.values(), default=self._head)
+        for i in range(self._tail, tail):
+            self._ring[i % len(self._ring)] = None
+        self._tail = tail
+        self._notify()
+
+    def _release(self, key):
+        del self._cursors[key]
+        self._advance(self._tail)
+        # True if nobody needs the source anymore
+        return not self._cursors
+
+    async def consume(self, key):
+        try:
+            while True:
+                index = self._cursors[key]
+                if index == self._head:
+                    if self._outcome is _FINISHED:
+                        return
+                    if self._outcome is not None:
+                        raise self._outcome
+                    full = self._head - self._tail == len(self._ring)
+                    if self._fetching or full:
+                        await self._wait()
+                    else:
+                        await self._fetch()
+                    continue
+                value = self._ring[index % len(self._ring)]
+                self._cursors[key] = index + 1
+                self._advance(index)
+                if (await yield_(value)) is not None:
+                    raise TypeError(
+                        "can't send non-None value to an atee() consumer"
+                    )
+        finally:
+            if self._release(key):
+                await self._agen.aclose()
+
+
+class _TeeConsumer(AsyncGenerator):
+    # A consumer that's closed or collected before it ever started never
+    # runs consume()'s 'finally' block, but it still has to give up its
+    # cursor, or it would hold back all the others forever.
+
+    def __init__(self, tee, key):
+        super().__init__(tee.consume(key))
+        self._tee = tee
+        self._key = key
+
+    async def aclose(self):
+        if self._state <= _AG_READY:
+            await super().aclose()
+            if self._tee._release(self._key):
+                await self._tee._agen.aclose()
+        else:
+            await super().aclose()
+
+    def __del__(self):
+        if self._state <= _AG_READY:
+            # (If that was the last one, the source gets finalized like any
+            # other generator that's been dropped.)
+            self._tee._release(self._key)
+        super().__del__()
+
+
+def atee(agen, n=2, max_buffer=128):
+    if n < 0:
+        raise ValueError("n must be at least 0")
+    if max_buffer < 1:
+        raise ValueError("max_buffer must be at least 1")
+    tee = _Tee(agen, n, max_buffer)
+    return tuple(_TeeConsumer(tee, key) for key in range(n))
@@ -1,14 +1,62 @@
 import pytest
 from functools import wraps, partial
+import asyncio
 import inspect
+import selectors
 import types
 
 
+# The delay is ignored; it's only there so this can stand in for a real sleep
 @types.coroutine
-def mock_sleep():
+def mock_sleep(seconds=0):
     yield "mock_sleep"
 
 
+# With autojump=True, the loop runs on virtual time, like trio's
+# MockClock(autojump_threshold=0): whenever it has nothing to do but wait for
+# a timer, the clock jumps straight to it. Sleeps take no real time, and
+# everything that can run before one ends does, however slow this machine is.
+# (It doesn't know about worker threads: waiting for one looks like having
+# nothing to do, so only use it for tests that don't.)
+class _AutojumpSelector:
+    def __init__(self, loop):
+        self._loop = loop
+        self._selector = selectors.DefaultSelector()
+
+    def select(self, timeout=None):
+        if timeout is None or timeout <= 0:
+            return self._selector.select(timeout)
+        events = self._selector.select(0)
+        if not events:
+            self._loop._now += timeout
+        return events
+
+    def __getattr__(self, name):
+        return getattr(self._selector, name)
+
+
+class _AutojumpLoop(asyncio.SelectorEventLoop):
+    def __init__(self):
+        self._now = 0.0
+        super().__init__(_AutojumpSelector(self))
+
+    def time(self):
+        return self._now
+
+
+# For tests that need a real event loop. (asyncio.run() is 3.7+.)
+def run_asyncio(async_fn, *args, autojump=False):
+    if autojump:
+        loop = _AutojumpLoop()
+    else:
+        loop = asyncio.new_event_loop()
+    try:
+        return loop.run_until_complete(async_fn(*args))
+    finally:
+        loop.run_until_complete(loop.shutdown_asyncgens())
+        loop.close()
+
+
 # Wrap any 'async def' tests so that they get automatically iterated.
 # We used to use pytest-asyncio as a convenient way to do this, but nowadays
 # pytest-asyncio uses us! In addition to it being generally bad for our test
@@ -0,0 +1,147 @@
+import pytest
+
+import asyncio
+
+from .conftest import run_asyncio
+from .. import abatch_array
+from .. import _arrays
+from .test_tee import Source
+
+
+@pytest.fixture(params=["numpy", "array"])
+def buffers(request, monkeypatch):
+    if request.param == "numpy":
+        pytest.importorskip("numpy")
+    else:
+        monkeypatch.setattr(_arrays, "_import_numpy", lambda: None)
+    return request.param
+
+
+async def batch_lists(agen, *args, **kwargs):
+    # The batches share a buffer, so we have to copy them as we go
+    lists = []
+    async with abatch_array(agen, *args, **kwargs) as batches:
+        async for batch in batches:
+            lists.append(batch.tolist())
+    return lists
+
+
+async def test_abatch_array(buffers):
+    source = Source([float(i) for i in range(10)])
+    assert await batch_lists(source.agen(), 4, "d") == [
+        [0.0, 1.0, 2.0, 3.0], [4.0, 5.0, 6.0, 7.0], [8.0, 9.0]
+    ]
+    assert source.closed
+
+    rows = [(i, -i) for i in range(5)]
+    assert await batch_lists(Source(rows).agen(), 2, "i") == [
+        [[0, 0], [1, -1]], [[2, -2], [3, -3]], [[4, -4]]
+    ]
+
+    assert await batch_lists(Source([]).agen(), 4, "d") == []
+
+    # Every batch is a view of the same buffer
+    source = Source([1.0, 2.0, 3.0, 4.0])
+    async with abatch_array(source.agen(), 2, "d") as batches:
+        first = await batches.__anext__()
+        assert first.tolist() == [1.0, 2.0]
+        second = await batches.__anext__()
+        assert first.tolist() == second.tolist() == [3.0, 4.0]
+    # Leaving the block closes the source
+    assert source.closed
+
+
+async def test_abatch_array_takes_values_as_they_come(buffers):
+    # Source() suspends before each value, so abatch_array() has to wait
+    batches = await batch_lists(Source(range(5)).agen(), 2, "i")
+    assert batches == [[0, 1], [2, 3], [4]]
+
+
+def test_abatch_array_numpy():
+    numpy = pytest.importorskip("numpy")
+
+    async def main():
+        dtype = numpy.dtype([("x", "f8"), ("n", "i4")])
+        source = Source([(0.5, 1), (1.5, 2)], asyncio.sleep)
+        async with abatch_array(source.agen(), 2, dtype) as batches:
+            batch = await batches.__anext__()
+            assert isinstance(batch, numpy.ndarray)
+            assert batch.dtype == dtype
+            assert batch["n"].tolist() == [1, 2]
+
+    run_asyncio(main)
+
+
+async def test_abatch_array_errors(buffers):
+    source = Source([1.0, 2.0, 3.0, KeyError("oops")])
+    async with abatch_array(source.agen(), 2, "d") as batches:
+        assert (await batches.__anext__()).tolist() == [1.0, 2.0]
+        # What came before the error is yielded first
+        assert (await batches.__anext__()).tolist() == [3.0]
+        with pytest.raises(KeyError):
+            await batches.__anext__()
+    assert source.closed
+
+    with pytest.raises(ValueError):
+        await batch_lists(Source([(1, 2), (3, 4, 5)]).agen(), 2, "i")
+
+    for (size, dtype) in [(0, "d"), (1, "not a dtype")]:
+        source = Source([1.0]).agen()
+        with pytest.raises((TypeError, ValueError)):
+            async with abatch_array(source, size, dtype):
+                pass  # pragma: no cover
+        # The source is closed anyway
+        with pytest.raises(StopAsyncIteration):
+            await source.__anext__()
+
+
+async def check_abatch_array_timeout(sleep):
+    # A batch is yielded once its first value has waited 'timeout' seconds,
+    # even if it isn't full
+    source = Source(range(7), sleep, delays={3: 0.1})
+    batches = await batch_lists(source.agen(), 4, "i", timeout=0.03)
+    assert batches == [[0, 1, 2], [3, 4, 5, 6]]
+    assert source.closed
+
+    # Full batches don't wait
+    source = Source(range(5), sleep, delays={4: 10})
+    async with abatch_array(source.agen(), 2, "i", timeout=10) as batches:
+        assert (await batches.__anext__()).tolist() == [0, 1]
+        assert (await batches.__anext__()).tolist() == [2, 3]
+    assert source.closed
+
+    source = Source([0, 1, KeyError("oops")], sleep)
+    async with abatch_array(source.agen(), 4, "i", timeout=10) as batches:
+        assert (await batches.__anext__()).tolist() == [0, 1]
+        with pytest.raises(KeyError):
+            await batches.__anext__()
+    assert source.closed
+
+    source = Source([0], sleep).agen()
+    with pytest.raises(ValueError):
+        async with abatch_array(source, 4, "i", timeout=0):
+            pass  # pragma: no cover
+
+
+def test_abatch_array_timeout_asyncio():
+    run_asyncio(check_abatch_array_timeout, asyncio.sleep)
+
+
+def test_abatch_array_timeout_trio():
+    trio = pytest.importorskip("trio")
+    trio.run(check_abatch_array_timeout, trio.sleep)
+
+
+def test_abatch_array_break_trio():
+    trio = pytest.importorskip("trio")
+
+    async def main():
+        # Leaving the block in the middle of a timed batch is fine under
+        # trio, since the task group belongs to the block
+        source = Source(range(100), trio.sleep, 0.001)
+        async with abatch_array(source.agen(), 4, "i", timeout=1) as batches:
+            async for batch in batches:
+                break
+        assert source.closed
+
+    trio.run(main)
@@ -11,6 +11,9 @@ from .. import (
     async_generator,
     yield_,
     yield_from_,
+    yield_many_,
+    anext_batch,
+    enable_stats,
     isasyncgen,
     isasyncgenfunction,
     get_asyncgen_hooks,
@@ -232,6 +235,42 @@ async def test_reentrance_forbidden_while_suspended_in_coroutine_runner():
         ag.asend(None).send(None)
 
 
+async def test_step_awaitable_is_reused():
+    agen = async_range(3)
+    first = agen.__anext__()
+    assert await first == 0
+    first_id = id(first)
+    del first
+    second = agen.asend(None)
+    assert id(second) == first_id
+    assert await second == 1
+    del second
+    # If the previous step is still outstanding, we get a fresh one
+    third = agen.__anext__()
+    fourth = agen.__anext__()
+    assert third is not fourth
+    assert await third == 2
+    with pytest.raises(StopAsyncIteration):
+        await fourth
+
+
+async def test_step_awaitable_cannot_be_awaited_twice():
+    agen = async_range(3)
+    step = agen.__anext__()
+    assert await step == 0
+    with pytest.raises(RuntimeError):
+        await step
+
+    # Not even once we've asked for the next step: as long as we still have
+    # the old one, we get a fresh one instead
+    next_step = agen.__anext__()
+    assert next_step is not step
+    with pytest.raises(RuntimeError):
+        await step
+    assert await next_step == 1
+    await agen.aclose()
+
+
 ################################################################
 #
 # asend
@@ -314,6 +353,18 @@ async def test_aclose_on_unstarted_generator():
         assert False  # pragma: no cover
 
 
+async def test_step_created_before_aclose():
+    aiter = async_range(3)
+    assert await aiter.__anext__() == 0
+    step = aiter.__anext__()
+    await aiter.aclose()
+    with pytest.raises(StopAsyncIteration):
+        await step
+    assert not aiter.ag_running
+    with pytest.raises(AttributeError):
+        aiter.ag_running = True
+
+
 async def test_aclose_on_finished_generator():
     aiter = async_range(3)
     async for obj in aiter:
@@ -614,6 +665,544 @@ async def test_yield_from_athrow_raises_StopAsyncIteration():
         raise AssertionError  # pragma: no cover
 
 
+@async_generator
+async def delegates_to(agen):
+    return await yield_from_(agen)
+
+
+def nested_delegation(agen, depth):
+    for _ in range(depth):
+        agen = delegates_to(agen)
+    return agen
+
+
+async def test_yield_from_splices_nested_async_generators():
+    events = []
+
+    @async_generator
+    async def innermost():
+        try:
+            value = await yield_("first")
+            while value != "stop":
+                try:
+                    value = await yield_(value * 2)
+                except KeyError as exc:
+                    events.append(("caught", exc))
+                    value = await yield_("after throw")
+            return "returned"
+        finally:
+            events.append("innermost finally")
+
+    inner = innermost()
+    outer = nested_delegation(inner, 10)
+    assert await outer.__anext__() == "first"
+    # The whole chain has been spliced into the outermost generator: it's
+    # stepping inner's coroutine directly.
+    assert len(outer._delegates) == 10
+    assert outer._it is inner._it
+    assert inner.ag_running
+    with pytest.raises(ValueError):
+        await inner.__anext__()
+
+    assert await outer.asend(21) == 42
+    exc = KeyError("x")
+    assert await outer.athrow(exc) == "after throw"
+    assert events == [("caught", exc)]
+    with pytest.raises(StopAsyncIteration) as excinfo:
+        await outer.asend("stop")
+    assert excinfo.value.args == ("returned",)
+    assert events == [("caught", exc), "innermost finally"]
+    assert not outer._delegates
+    assert not inner.ag_running
+
+
+async def test_yield_from_splice_exceptions_and_aclose():
+    @async_generator
+    async def raises():
+        await yield_(1)
+        raise ValueError("boom")
+
+    outer = nested_delegation(raises(), 5)
+    assert await outer.__anext__() == 1
+    with pytest.raises(ValueError):
+        await outer.__anext__()
+
+    # PEP 479 still applies to a spliced delegate
+    @async_generator
+    async def raises_StopAsyncIteration():
+        await yield_(1)
+        raise StopAsyncIteration
+
+    outer = nested_delegation(raises_StopAsyncIteration(), 5)
+    assert await outer.__anext__() == 1
+    with pytest.raises(RuntimeError) as excinfo:
+        await outer.__anext__()
+    assert isinstance(excinfo.value.__cause__, StopAsyncIteration)
+
+    closed = []
+
+    @async_generator
+    async def close_me():
+        try:
+            await yield_(1)
+            await mock_sleep()
+        finally:
+            closed.append(True)
+
+    outer = nested_delegation(close_me(), 5)
+    assert await outer.__anext__() == 1
+    await outer.aclose()
+    assert closed == [True]
+
+
+async def test_yield_from_partially_consumed_async_generator():
+    inner = async_range(4)
+    assert await inner.__anext__() == 0
+    assert await collect(nested_delegation(inner, 3)) == [1, 2, 3]
+    # Exhausted generators are delegated to the slow way, and finish at once
+    assert await collect(delegates_to(inner)) == []
+
+
+async def test_yield_from_splice_calls_firstiter(local_asyncgen_hooks):
+    seen = []
+    set_asyncgen_hooks(firstiter=seen.append)
+    inner = async_range(2)
+    outer = delegates_to(inner)
+    assert await collect(outer) == [0, 1]
+    assert seen == [outer, inner]
+
+
+################################################################
+#
+# yield_many_
+#
+################################################################
+
+
+async def test_yield_many_():
+    resumed = []
+
+    @async_generator
+    async def batches():
+        for batch in ([0, 1, 2], (), iter([3])):
+            await yield_many_(batch)
+            resumed.append(len(resumed))
+        await yield_(4)
+
+    agen = batches()
+    assert await agen.__anext__() == 0
+    assert resumed == []
+    assert await agen.__anext__() == 1
+    assert await agen.__anext__() == 2
+    # The coroutine only runs again once the batch is used up
+    assert resumed == []
+    assert await agen.__anext__() == 3
+    assert resumed == [0, 1]
+    assert await collect(agen) == [4]
+    assert resumed == [0, 1, 2]
+
+
+async def test_yield_many_asend():
+    @async_generator
+    async def echo_last_sent():
+        sent = await yield_many_("abc")
+        await yield_(sent)
+        assert (await yield_many_([])) is None
+        await mock_sleep()
+
+    agen = echo_last_sent()
+    assert await agen.asend(None) == "a"
+    # Values sent while the batch isn't used up yet are dropped, and the last
+    # one is returned from yield_many_
+    assert await agen.asend(1) == "b"
+    assert await agen.asend(2) == "c"
+    assert await agen.asend(3) == 3
+    assert await collect(agen) == []
+
+
+async def test_yield_many_athrow_and_aclose():
+    events = []
+
+    @async_generator
+    async def catcher():
+        try:
+            await yield_many_(range(5))
+        except KeyError:
+            events.append("caught")
+        try:
+            await yield_many_(range(5))
+        finally:
+            events.append("closed")
+
+    agen = catcher()
+    assert await agen.__anext__() == 0
+    assert await agen.__anext__() == 1
+    # athrow abandons the rest of the batch and raises at the yield_many_
+    assert await agen.athrow(KeyError) == 0
+    assert events == ["caught"]
+    await agen.aclose()
+    assert events == ["caught", "closed"]
+
+    agen = catcher()
+    assert await agen.__anext__() == 0
+    assert await agen.athrow(KeyError) == 0
+    assert await agen.__anext__() == 1
+    agen.__del__()
+    assert events == ["caught", "closed", "caught", "closed"]
+
+
+async def test_yield_many_bad_iterable():
+    def broken():
+        yield "fine"
+        raise ValueError("oops")
+
+    @async_generator
+    async def uses_broken():
+        with pytest.raises(ValueError):
+            await yield_many_(broken())
+        await yield_("caught")
+        with pytest.raises(TypeError):
+            await yield_many_(None)
+
+    assert await collect(uses_broken()) == ["fine", "caught"]
+
+
+async def test_yield_many_spliced():
+    @async_generator
+    async def inner():
+        await yield_many_([1, 2])
+        return "done"
+
+    @async_generator
+    async def outer():
+        await yield_(await yield_from_(inner()))
+
+    assert await collect(outer()) == [1, 2, "done"]
+
+
+async def test_yield_many_spliced_partway():
+    @async_generator
+    async def inner():
+        await yield_many_([1, 2, 3])
+        await yield_(4)
+
+    @async_generator
+    async def outer(agen):
+        await yield_from_(agen)
+
+    # The rest of the batch isn't lost when we delegate to it partway
+    # through
+    agen = inner()
+    assert await agen.__anext__() == 1
+    assert await collect(outer(agen)) == [2, 3, 4]
+
+
+################################################################
+#
+# anext_batch
+#
+################################################################
+
+
+@async_generator
+async def bursty():
+    await yield_(0)
+    await yield_(1)
+    await mock_sleep()
+    await yield_many_([2, 3, 4])
+    await mock_sleep()
+    await mock_sleep()
+    await yield_(5)
+    return "bye"
+
+
+async def test_anext_batch():
+    agen = bursty()
+    assert await agen.anext_batch(1) == [0]
+    # Stops after the first value that needed a real suspension
+    assert await agen.anext_batch(10) == [1, 2]
+    assert await agen.anext_batch(2) == [3, 4]
+    assert await agen.anext_batch(10) == [5]
+    with pytest.raises(StopAsyncIteration) as excinfo:
+        await agen.anext_batch(10)
+    assert excinfo.value.args == ("bye",)
+    with pytest.raises(StopAsyncIteration):
+        await agen.anext_batch(10)
+
+    with pytest.raises(ValueError):
+        await agen.anext_batch(0)
+
+
+async def test_anext_batch_defers_exceptions():
+    @async_generator
+    async def fails_after(count):
+        for i in range(count):
+            await yield_(i)
+        raise KeyError("oops")
+
+    agen = fails_after(3)
+    assert await agen.anext_batch(10) == [0, 1, 2]
+    with pytest.raises(KeyError):
+        await agen.__anext__()
+    with pytest.raises(StopAsyncIteration):
+        await agen.__anext__()
+
+    agen = fails_after(0)
+    with pytest.raises(KeyError):
+        await agen.anext_batch(10)
+
+    # The return value isn't lost either
+    agen = async_gen_with_non_None_return()
+    assert await agen.anext_batch(10) == [1, 2]
+    with pytest.raises(StopAsyncIteration) as excinfo:
+        await agen.__anext__()
+    assert excinfo.value.args == ("hi",)
+
+    # ...unless you close the generator
+    agen = fails_after(1)
+    assert await agen.anext_batch(10) == [0]
+    await agen.aclose()
+    with pytest.raises(StopAsyncIteration):
+        await agen.anext_batch(10)
+
+
+@async_generator
+async def batch_inner():
+    await yield_("inner 0")
+    await mock_sleep()
+    await yield_("inner 1")
+    return "inner done"
+
+
+def broken_batch():
+    yield "many 2"
+    raise KeyError("oops")
+
+
+@async_generator
+async def batch_outer():
+    await yield_("first")
+    await yield_many_(["many 0", "many 1"])
+    await yield_many_([])
+    try:
+        await yield_many_(broken_batch())
+    except KeyError:
+        await yield_("caught")
+    await yield_(await yield_from_(batch_inner()))
+    await mock_sleep()
+    await yield_many_(range(3))
+    await yield_("last")
+
+
+async def test_anext_batch_matches_iteration():
+    # anext_batch() resumes simple generators itself, rather than going
+    # through __anext__(); whatever the batch sizes, the values must be the
+    # same as plain iteration gives.
+    expected = await collect(batch_outer())
+    for max_items in [1, 2, 3, 100]:
+        agen = batch_outer()
+        values = []
+        while True:
+            try:
+                values += await agen.anext_batch(max_items)
+            except StopAsyncIteration:
+                break
+        assert values == expected
+
+    # It's still a reentrant call if the generator does it to itself
+    @async_generator
+    async def reentrant():
+        with pytest.raises(ValueError):
+            await agen.anext_batch(10)
+        await yield_("ok")
+
+    agen = reentrant()
+    assert await agen.anext_batch(10) == ["ok"]
+
+
+def test_anext_batch_forwards_sends_and_throws():
+    coro = anext_batch(yield_after_different_entries(), 10)
+    assert hostile_coroutine_runner(coro) == [1, 2]
+
+
+async def test_anext_batch_free_function():
+    assert await anext_batch(async_range(5), 3) == [0, 1, 2]
+
+    class Countdown:
+        def __init__(self, count):
+            self.count = count
+
+        def __aiter__(self):
+            return self  # pragma: no cover
+
+        async def __anext__(self):
+            self.count -= 1
+            if self.count < 0:
+                raise StopAsyncIteration
+            if self.count == 1:
+                raise ValueError("one")
+            await mock_sleep()
+            return self.count
+
+    ait = Countdown(4)
+    assert await anext_batch(ait, 10) == [3]
+    assert await anext_batch(ait, 10) == [2]
+    with pytest.raises(ValueError):
+        await anext_batch(ait, 10)
+
+    if sys.version_info >= (3, 6):
+        agen = native_async_range(5)
+        assert await anext_batch(agen, 3) == [0, 1, 2]
+        assert await anext_batch(agen, 3) == [3, 4]
+        with pytest.raises(StopAsyncIteration):
+            await anext_batch(agen, 3)
+
+
+async def test_anext_batch_free_function_exceptions():
+    class FailsAfterOne:
+        def __init__(self):
+            self.done = False
+
+        def __aiter__(self):
+            return self  # pragma: no cover
+
+        async def __anext__(self):
+            if self.done:
+                raise KeyError("oops")
+            self.done = True
+            return "one"
+
+    # We can't hold the exception back until its next __anext__(), so it's
+    # raised right away, with the values from before it attached
+    ait = FailsAfterOne()
+    with pytest.raises(KeyError) as excinfo:
+        await anext_batch(ait, 10)
+    assert excinfo.value.partial_batch == ["one"]
+
+    if sys.version_info >= (3, 6):
+
+        @async_generator(native=True)
+        async def native_fails():
+            await yield_(1)
+            await yield_(2)
+            raise ValueError("oops")
+
+        agen = native_fails()
+        with pytest.raises(ValueError) as excinfo:
+            await anext_batch(agen, 10)
+        assert excinfo.value.partial_batch == [1, 2]
+
+
+################################################################
+# Statistics
+################################################################
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+async def test_stats(monkeypatch):
+    from .. import _impl
+
+    clock = FakeClock()
+    monkeypatch.setattr(_impl, "perf_counter", clock)
+
+    @async_generator(stats=True)
+    async def timed():
+        clock.now += 1
+        await mock_sleep()
+        clock.now += 2
+        value = await yield_(1)
+        clock.now += 4
+        try:
+            await yield_(value)
+        except KeyError:
+            clock.now += 8
+
+    agen = timed()
+    stats = agen.ag_stats
+    assert stats.steps == stats.yields == 0
+    assert stats.time_to_first_item is None
+
+    assert await agen.__anext__() == 1
+    # One step up to mock_sleep(), and another after it
+    assert stats.steps == 2
+    assert stats.yields == 1
+    assert stats.body_time == 3
+    assert stats.suspended_time == 0
+    assert stats.time_to_first_item == 3
+
+    clock.now += 16
+    assert await agen.asend("hi") == "hi"
+    assert (stats.steps, stats.yields, stats.asends) == (3, 2, 1)
+    assert stats.body_time == 7
+    assert stats.suspended_time == 16
+
+    clock.now += 32
+    with pytest.raises(StopAsyncIteration):
+        await agen.athrow(KeyError)
+    assert (stats.steps, stats.yields, stats.athrows) == (4, 2, 1)
+    assert stats.body_time == 15
+    assert stats.suspended_time == 48
+    assert stats.time_to_first_item == 3
+    assert "steps=4 yields=2" in repr(stats)
+
+    # Nothing changes once it's finished
+    with pytest.raises(StopAsyncIteration):
+        await agen.__anext__()
+    assert stats.steps == 4
+
+
+async def test_stats_enabled_globally():
+    assert async_range(1).ag_stats is None
+
+    enable_stats()
+    try:
+        agen = async_range(3)
+        assert await collect(agen) == [0, 1, 2]
+        assert agen.ag_stats.yields == 3
+        assert agen.ag_stats.steps == 4
+    finally:
+        enable_stats(False)
+    assert async_range(1).ag_stats is None
+
+
+async def test_stats_are_not_lost_by_yield_from_():
+    @async_generator(stats=True)
+    async def inner():
+        await yield_(1)
+        await yield_(2)
+
+    @async_generator
+    async def outer(agen):
+        await yield_from_(agen)
+
+    agen = inner()
+    assert await collect(outer(agen)) == [1, 2]
+    assert agen.ag_stats.yields == 2
+    assert agen.ag_stats.steps == 3
+
+    # And a generator with stats counts values from its delegates
+    agen = async_generator(stats=True)(outer.__wrapped__)(async_range(2))
+    assert await collect(agen) == [0, 1]
+    assert agen.ag_stats.yields == 2
+
+
+async def test_stats_disable_native_mode():
+    @async_generator(native=True, stats=True)
+    async def counted():
+        await yield_(1)
+
+    agen = counted()
+    assert await collect(agen) == [1]
+    assert agen.ag_stats.yields == 1
+
+
 ################################################################
 # __del__
 ################################################################
@@ -1013,3 +1602,38 @@ async def test_gc_hooks_behavior(local_asyncgen_hooks):
         "before aclose B", "mock_sleep B", "before aclose C", "unwind 3 C",
         "after aclose both"
     ]
+
+
+@async_generator
+async def in_cycle(events, box):
+    try:
+        await yield_(1)
+        await yield_(2)  # pragma: no cover
+    finally:
+        events.append("unwind")
+
+
+async def test_gc_cycle_with_own_coroutine(local_asyncgen_hooks, monkeypatch):
+    # No finalizer, so __del__ would throw GeneratorExit in itself
+    set_asyncgen_hooks(None, None)
+    errors = []
+
+    def hook(info):  # pragma: no cover
+        errors.append(info.exc_value)
+
+    monkeypatch.setattr(sys, "unraisablehook", hook, raising=False)
+    # The generator's frame refers to the generator (through box), so the GC
+    # finds it and its coroutine in the same cycle, and finalizes the
+    # coroutine first. Then there's nothing left for __del__ to do, and in
+    # particular it mustn't try to resume the coroutine ("cannot reuse
+    # already awaited coroutine").
+    events = []
+    box = []
+    agen = in_cycle(events, box)
+    box.append(agen)
+    assert await agen.__anext__() == 1
+    del agen, box
+    for _ in range(4):
+        gc.collect()
+    assert events == ["unwind"]
+    assert errors == []
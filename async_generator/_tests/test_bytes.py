@@ -0,0 +1,179 @@
+import pytest
+
+import array
+import os
+
+from .conftest import mock_sleep
+from .. import (
+    async_generator,
+    yield_,
+    aclosing,
+    AsyncByteStream,
+    IncompleteReadError,
+    mmap_chunks,
+)
+from .test_async_generator import collect
+
+
+@async_generator
+async def chunks(*pieces):
+    for piece in pieces:
+        await mock_sleep()
+        await yield_(piece)
+
+
+async def test_readexactly():
+    data = b"abcdef"
+    stream = AsyncByteStream(chunks(data, b"", b"gh", b"ijk"))
+    first = await stream.readexactly(2)
+    assert first == b"ab"
+    # Within one chunk, it's a view of the original chunk
+    assert isinstance(first, memoryview)
+    assert first.obj is data
+    assert await stream.readexactly(0) == b""
+    assert await stream.readexactly(4) == b"cdef"
+    # Across chunks, it's copied
+    crossing = await stream.readexactly(4)
+    assert crossing == b"ghij"
+    assert crossing.obj is not data
+    with pytest.raises(IncompleteReadError) as excinfo:
+        await stream.readexactly(2)
+    assert excinfo.value.partial == b"k"
+    assert excinfo.value.expected == 2
+    assert isinstance(excinfo.value, EOFError)
+    assert stream.at_eof()
+
+    values = array.array("H", [1, 2])
+    stream = AsyncByteStream(chunks(values))
+    assert bytes(await stream.readexactly(4)) == values.tobytes()
+
+    with pytest.raises(ValueError):
+        await stream.readexactly(-1)
+
+
+async def test_readuntil():
+    stream = AsyncByteStream(
+        chunks(b"one\r\ntwo", b"\r", b"\nthree\r\n", b"fou", b"r")
+    )
+    line = await stream.readuntil(b"\r\n")
+    assert line == b"one\r\n"
+    assert isinstance(line, memoryview)
+    # The separator itself is split across chunks
+    assert await stream.readuntil(b"\r\n") == b"two\r\n"
+    assert await stream.readuntil(b"\r\n") == b"three\r\n"
+    with pytest.raises(IncompleteReadError) as excinfo:
+        await stream.readuntil(b"\r\n")
+    assert excinfo.value.partial == b"four"
+    assert excinfo.value.expected is None
+
+    # Separators longer than the chunks
+    stream = AsyncByteStream(chunks(*[bytes([b]) for b in b"xx-ab-cd-y"]))
+    assert await stream.readuntil(b"-cd-") == b"xx-ab-cd-"
+    assert await stream.readuntil(b"y") == b"y"
+
+    with pytest.raises(ValueError):
+        await stream.readuntil(b"")
+
+
+async def test_readinto():
+    stream = AsyncByteStream(chunks(b"abc", b"defg"))
+    buffer = bytearray(5)
+    assert await stream.readinto(buffer) == 3
+    assert buffer[:3] == b"abc"
+    assert await stream.readexactly(1) == b"d"
+    # It doesn't wait for more than it already has
+    assert await stream.readinto(buffer) == 3
+    assert buffer[:3] == b"efg"
+    assert await stream.readinto(buffer) == 0
+    assert await stream.readinto(bytearray()) == 0
+
+
+async def test_aclose():
+    closed = []
+
+    @async_generator
+    async def source():
+        try:
+            await yield_(b"abc")
+            await yield_(b"def")
+        finally:
+            closed.append(True)
+
+    async with aclosing(AsyncByteStream(source())) as stream:
+        assert await stream.readexactly(1) == b"a"
+    assert closed == [True]
+    assert stream.at_eof()
+
+
+def mapped(path):
+    with open("/proc/self/maps") as maps:
+        return path in maps.read()
+
+
+@pytest.fixture
+def data_file(tmp_path):
+    path = str(tmp_path / "data")
+    data = bytes(range(256)) * 40
+    with open(path, "wb") as file:
+        file.write(data)
+    return (path, data)
+
+
+async def copies(agen):
+    # The views are released as we go, so we have to copy them
+    chunks = []
+    async for view in agen:
+        chunks.append(bytes(view))
+    return chunks
+
+
+async def test_mmap_chunks(data_file):
+    (path, data) = data_file
+    views = []
+    async for view in mmap_chunks(path, 4096):
+        assert isinstance(view, memoryview)
+        views.append(view)
+        assert view == data[4096 * (len(views) - 1):4096 * len(views)]
+    assert len(views) == 3
+    # They've all been released
+    with pytest.raises(ValueError):
+        bytes(views[0])
+
+    agen = mmap_chunks(path, 1000, sequential=True)
+    assert b"".join(await copies(agen)) == data
+
+    with open(path, "rb") as file:
+        agen = mmap_chunks(file, 10**6)
+        assert await copies(agen) == [data]
+        # It's still ours
+        assert not file.closed
+
+    open(path, "wb").close()
+    assert await collect(mmap_chunks(path)) == []
+
+    with pytest.raises(ValueError):
+        await mmap_chunks(path, 0).__anext__()
+
+
+@pytest.mark.skipif(
+    not os.path.exists("/proc/self/maps"), reason="needs /proc/self/maps"
+)
+async def test_mmap_chunks_aclose_unmaps(data_file):
+    (path, data) = data_file
+    async with aclosing(mmap_chunks(path, 1024)) as agen:
+        first = await agen.__anext__()
+        second = await agen.__anext__()
+        assert bytes(first) == data[:1024]
+        assert mapped(path)
+    # Even though we still have the views
+    assert not mapped(path)
+    with pytest.raises(ValueError):
+        bytes(second)
+
+    async with aclosing(mmap_chunks(path, 1024)) as agen:
+        mine = (await agen.__anext__())[:10]
+    # A view we made ourselves keeps it alive
+    assert bytes(mine) == data[:10]
+    assert mapped(path)
+    del mine
+    assert not mapped(path)
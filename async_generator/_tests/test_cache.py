@@ -0,0 +1,268 @@
+import pytest
+
+import os
+import subprocess
+import sys
+
+from .conftest import mock_sleep
+from .. import (
+    async_generator,
+    yield_,
+    cached_async_generator,
+    disk_cached_async_generator,
+    isasyncgenfunction,
+)
+from .. import _cache
+from .test_async_generator import collect
+
+
+class Pages:
+    def __init__(self):
+        self.runs = 0
+
+    def make(self, **options):
+        @cached_async_generator(**options)
+        async def pages(name, count=3, fail=False):
+            self.runs += 1
+            for i in range(count):
+                await mock_sleep()
+                await yield_("{}-{}".format(name, i))
+            if fail:
+                raise KeyError(name)
+
+        return pages
+
+
+async def test_cached_async_generator():
+    source = Pages()
+    pages = source.make()
+    assert isasyncgenfunction(pages)
+    assert await collect(pages("a")) == ["a-0", "a-1", "a-2"]
+    assert await collect(pages("a")) == ["a-0", "a-1", "a-2"]
+    assert source.runs == 1
+    assert await collect(pages("a", count=1)) == ["a-0"]
+    assert await collect(pages("b")) == ["b-0", "b-1", "b-2"]
+    assert source.runs == 3
+    assert pages.cache_info()[:3] == (1, 3, 3)
+
+    # Unhashable arguments work, they just aren't cached
+    assert await collect(pages(["c"])) == ["['c']-0", "['c']-1", "['c']-2"]
+    assert await collect(pages(["c"])) == ["['c']-0", "['c']-1", "['c']-2"]
+    assert source.runs == 5
+
+    pages.cache_clear()
+    assert pages.cache_info() == (0, 0, 0, 0)
+    await collect(pages("a"))
+    assert source.runs == 6
+
+
+async def test_cached_async_generator_incomplete_runs():
+    source = Pages()
+    pages = source.make()
+    with pytest.raises(KeyError):
+        await collect(pages("a", fail=True))
+    with pytest.raises(KeyError):
+        await collect(pages("a", fail=True))
+    assert source.runs == 2
+
+    agen = pages("b")
+    assert await agen.__anext__() == "b-0"
+    await agen.aclose()
+    assert await collect(pages("b")) == ["b-0", "b-1", "b-2"]
+    assert source.runs == 4
+    assert pages.cache_info().entries == 1
+
+
+async def test_cached_async_generator_eviction():
+    source = Pages()
+    pages = source.make(max_entries=2)
+    for name in ["a", "b", "a", "c"]:
+        await collect(pages(name))
+    assert source.runs == 3
+    # b was the least recently used
+    await collect(pages("a"))
+    await collect(pages("c"))
+    assert source.runs == 3
+    await collect(pages("b"))
+    assert source.runs == 4
+
+    source = Pages()
+    size = pages.cache_info().bytes // 2
+    pages = source.make(max_bytes=size * 2)
+    await collect(pages("a"))
+    await collect(pages("b"))
+    assert pages.cache_info().entries == 2
+    await collect(pages("c"))
+    assert pages.cache_info().entries == 2
+    # Too big to be cached at all
+    await collect(pages("d", count=100))
+    await collect(pages("d", count=100))
+    assert source.runs == 5
+    assert pages.cache_info().entries == 2
+
+
+async def test_cached_async_generator_ttl(monkeypatch):
+    from .. import _cache
+    now = [0.0]
+    monkeypatch.setattr(_cache, "monotonic", lambda: now[0])
+
+    source = Pages()
+    pages = source.make(ttl=10)
+    await collect(pages("a"))
+    now[0] = 9.9
+    await collect(pages("a"))
+    assert source.runs == 1
+    now[0] = 10
+    await collect(pages("a"))
+    assert source.runs == 2
+    assert pages.cache_info().entries == 1
+
+
+def test_cached_async_generator_bad_args():
+    for options in [
+        {"max_entries": 0},
+        {"max_bytes": -1},
+        {"ttl": 0},
+    ]:
+        with pytest.raises(ValueError):
+            Pages().make(**options)
+
+
+async def test_cached_async_generator_native():
+    runs = []
+
+    @cached_async_generator
+    @async_generator(native=True)
+    async def native(x):
+        runs.append(x)
+        await yield_(x)
+
+    assert await collect(native(1)) == [1]
+    assert await collect(native(1)) == [1]
+    assert runs == [1]
+
+
+class Crawler:
+    def __init__(self, directory, version=0):
+        self.runs = 0
+
+        @disk_cached_async_generator(str(directory), version=version)
+        async def crawl(name, count=3, fail=False, unpicklable=False):
+            self.runs += 1
+            for i in range(count):
+                await mock_sleep()
+                if unpicklable:
+                    await yield_(lambda: i)
+                else:
+                    await yield_({"name": name, "page": i})
+            if fail:
+                raise KeyError(name)
+
+        self.crawl = crawl
+
+
+def entry_files(directory):
+    return sorted(
+        name for path, dirs, names in os.walk(str(directory)) for name in names
+    )
+
+
+async def test_disk_cached_async_generator(tmp_path):
+    crawler = Crawler(tmp_path)
+    expected = [{"name": "a", "page": i} for i in range(3)]
+    assert isasyncgenfunction(crawler.crawl)
+    assert await collect(crawler.crawl("a")) == expected
+    assert len(entry_files(tmp_path)) == 1
+    assert await collect(crawler.crawl("a")) == expected
+    assert crawler.runs == 1
+
+    # It survives a restart
+    crawler = Crawler(tmp_path)
+    agen = crawler.crawl("a")
+    assert await agen.__anext__() == expected[0]
+    await agen.aclose()
+    assert await collect(crawler.crawl("a")) == expected
+    assert crawler.runs == 0
+
+    await collect(crawler.crawl("a", count=1))
+    await collect(crawler.crawl(name="a"))
+    assert crawler.runs == 2
+    assert len(entry_files(tmp_path)) == 3
+
+    # A new version doesn't see the old entries
+    crawler = Crawler(tmp_path, version=2)
+    await collect(crawler.crawl("a"))
+    assert crawler.runs == 1
+
+    crawler.crawl.cache_invalidate("a")
+    await collect(crawler.crawl("a"))
+    assert crawler.runs == 2
+    crawler.crawl.cache_clear()
+    assert entry_files(tmp_path) == []
+
+
+async def test_disk_cached_async_generator_incomplete_runs(tmp_path):
+    crawler = Crawler(tmp_path)
+    with pytest.raises(KeyError):
+        await collect(crawler.crawl("a", fail=True))
+    agen = crawler.crawl("a")
+    await agen.__anext__()
+    await agen.aclose()
+    assert entry_files(tmp_path) == []
+
+    # Values that can't be pickled
+    assert len(await collect(crawler.crawl("a", unpicklable=True))) == 3
+    # Arguments that can't be pickled
+    await collect(crawler.crawl(lambda: None))
+    await collect(crawler.crawl(lambda: None))
+    assert crawler.runs == 5
+    assert entry_files(tmp_path) == []
+
+
+async def test_disk_cached_async_generator_never_serves_partial_entries(
+        tmp_path
+):
+    crawler = Crawler(tmp_path)
+    expected = await collect(crawler.crawl("a", count=10))
+    [path] = [
+        os.path.join(dirpath, name)
+        for dirpath, dirs, names in os.walk(str(tmp_path)) for name in names
+    ]
+    with open(path, "rb") as file:
+        data = file.read()
+
+    for size in [0, 4, len(data) // 2, len(data) - 1]:
+        # As if we crashed while writing it
+        with open(path, "wb") as file:
+            file.write(data[:size])
+        crawler.runs = 0
+        assert await collect(crawler.crawl("a", count=10)) == expected
+        assert crawler.runs == 1
+        # ...and it was replaced with a complete one
+        with open(path, "rb") as file:
+            assert file.read() == data
+
+
+def test_disk_cached_async_generator_keys_are_canonical():
+    # The order of a set of strings depends on the hash seed, which is
+    # different in every process, and the order of a dict on how it was
+    # built. Neither of them may change the key.
+    code = (
+        "from async_generator._cache import _entry_path\n"
+        "print(_entry_path('d', 0, (frozenset('abcdefgh'),),"
+        " {'tags': [{'x', 'y', 'z'}], 'opts': {'a': 1, 'b': 2}}))\n"
+    )
+    root = os.path.dirname(os.path.dirname(os.path.abspath(_cache.__file__)))
+    paths = set()
+    for seed in ["1", "2", "3"]:
+        env = dict(os.environ, PYTHONHASHSEED=seed, PYTHONPATH=root)
+        output = subprocess.check_output([sys.executable, "-c", code], env=env)
+        paths.add(output.decode().strip())
+    assert len(paths) == 1
+
+    args = (frozenset("hgfedcba"),)
+    kwargs = {"opts": {"b": 2, "a": 1}, "tags": [{"z", "y", "x"}]}
+    assert _cache._entry_path("d", 0, args, kwargs) == paths.pop()
+    # Equal values of different types still get different keys
+    as_set = _cache._entry_path("d", 0, ({1},), {})
+    assert as_set != _cache._entry_path("d", 0, (frozenset({1}),), {})
@@ -0,0 +1,384 @@
+import pytest
+
+import asyncio
+
+from .conftest import run_asyncio
+from .. import (
+    async_generator,
+    yield_,
+    prefetch,
+    amap,
+    aprocess_map,
+    amerge,
+)
+from .test_async_generator import collect
+from .test_tee import Source
+
+
+async def check_prefetch(sleep):
+    producer = Source(range(100), sleep)
+    async with prefetch(producer.agen(), depth=3) as agen:
+        assert await agen.__anext__() == 0
+        await sleep(0.01)
+        # 1 consumed, 3 in the buffer, and one more waiting to go in
+        assert producer.produced == 5
+        assert await agen.__anext__() == 1
+        await sleep(0.01)
+        assert producer.produced == 6
+    assert producer.closed
+    # The generator we got is closed too
+    with pytest.raises(StopAsyncIteration):
+        await agen.__anext__()
+
+    producer = Source(range(5), sleep)
+    async with prefetch(producer.agen(), depth=2) as agen:
+        assert await collect(agen) == [0, 1, 2, 3, 4]
+        # Leaving the generator doesn't cancel us
+        await sleep(0.01)
+    assert producer.closed
+
+    producer = Source([0, 1, 2, KeyError(3)], sleep)
+    async with prefetch(producer.agen()) as agen:
+        assert await agen.__anext__() == 0
+        assert await agen.__anext__() == 1
+        assert await agen.__anext__() == 2
+        with pytest.raises(KeyError):
+            await agen.__anext__()
+        with pytest.raises(StopAsyncIteration):
+            await agen.__anext__()
+
+
+# The sleeps in these tests just let the background tasks get as far as they
+# can, so they run on virtual time, where that doesn't depend on how long the
+# sleeps are.
+def test_prefetch_asyncio():
+    run_asyncio(check_prefetch, asyncio.sleep, autojump=True)
+
+
+def test_prefetch_trio():
+    trio = pytest.importorskip("trio")
+    testing = pytest.importorskip("trio.testing")
+    clock = testing.MockClock(autojump_threshold=0)
+    trio.run(check_prefetch, trio.sleep, clock=clock)
+
+
+def test_prefetch_asend_athrow_aclose():
+    async def main():
+        producer = Source(range(100), asyncio.sleep)
+        async with prefetch(producer.agen()) as agen:
+            assert await agen.asend(None) == 0
+            with pytest.raises(TypeError):
+                await agen.asend("hi")
+            with pytest.raises(StopAsyncIteration):
+                await agen.__anext__()
+            # Once the consumer's generator is finished, so is the producer
+            await asyncio.sleep(0.01)
+            assert producer.closed
+
+        producer = Source(range(100), asyncio.sleep)
+        async with prefetch(producer.agen()) as agen:
+            await agen.__anext__()
+            with pytest.raises(ValueError):
+                await agen.athrow(ValueError)
+            await asyncio.sleep(0.01)
+            assert producer.closed
+
+        producer = Source(range(100), asyncio.sleep)
+        async with prefetch(producer.agen()) as agen:
+            await agen.__anext__()
+            await agen.aclose()
+            await asyncio.sleep(0.01)
+            assert producer.closed
+
+    run_asyncio(main, autojump=True)
+
+
+def test_prefetch_consumer_error():
+    async def main():
+        producer = Source(range(100), asyncio.sleep)
+        with pytest.raises(KeyError):
+            async with prefetch(producer.agen()) as agen:
+                await agen.__anext__()
+                raise KeyError
+        assert producer.closed
+
+    run_asyncio(main)
+
+
+def test_prefetch_bad_depth():
+    async def main():
+        async with prefetch(Source(range(1), asyncio.sleep).agen(), depth=0):
+            pass  # pragma: no cover
+
+    with pytest.raises(ValueError):
+        run_asyncio(main)
+
+
+class Fetcher:
+    def __init__(self, sleep, delays):
+        self.sleep = sleep
+        self.delays = delays
+        self.running = 0
+        self.max_running = 0
+        self.started = []
+        self.cancelled = []
+
+    async def fetch(self, i):
+        self.started.append(i)
+        self.running += 1
+        self.max_running = max(self.max_running, self.running)
+        try:
+            await self.sleep(abs(self.delays[i]))
+        except BaseException:
+            self.cancelled.append(i)
+            raise
+        finally:
+            self.running -= 1
+        if self.delays[i] < 0:
+            raise KeyError(i)
+        return i * 10
+
+
+async def check_amap(sleep):
+    delays = [0.05, 0.01, 0.03, 0.0, 0.02, 0.04]
+    fetcher = Fetcher(sleep, delays)
+    producer = Source(range(len(delays)), sleep)
+    async with amap(fetcher.fetch, producer.agen(), 3) as results:
+        assert await collect(results) == [0, 10, 20, 30, 40, 50]
+    assert fetcher.max_running == 3
+    assert producer.closed
+
+    fetcher = Fetcher(sleep, delays)
+    source = Source(range(6), sleep).agen()
+    async with amap(fetcher.fetch, source, 6, ordered=False) as results:
+        assert await collect(results) == [30, 10, 40, 20, 50, 0]
+
+    # A slow first item holds up the rest, once they fill the window
+    fetcher = Fetcher(sleep, [0.05] + [0] * 20)
+    source = Source(range(21), sleep).agen()
+    async with amap(fetcher.fetch, source, 2, window=5) as results:
+        assert await results.__anext__() == 0
+        assert fetcher.started == [0, 1, 2, 3, 4]
+
+    # Errors come out in order, and stop everything
+    fetcher = Fetcher(sleep, [0.01, -0.01, 1, 1])
+    producer = Source(range(4), sleep)
+    with pytest.raises(KeyError):
+        async with amap(fetcher.fetch, producer.agen(), 4) as results:
+            assert await results.__anext__() == 0
+            await results.__anext__()
+    assert 2 in fetcher.cancelled
+    assert fetcher.running == 0
+    assert producer.closed
+
+    # And so does leaving the block early
+    fetcher = Fetcher(sleep, [0, 1, 1])
+    producer = Source(range(3), sleep)
+    async with amap(fetcher.fetch, producer.agen(), 3) as results:
+        async for result in results:
+            assert result == 0
+            break
+    assert 1 in fetcher.cancelled
+    assert fetcher.running == 0
+    assert producer.closed
+    # The generator we got is closed too
+    with pytest.raises(StopAsyncIteration):
+        await results.__anext__()
+
+
+# On virtual time, so the calls finish in order of their delays, however
+# slow this machine is
+def test_amap_asyncio():
+    run_asyncio(check_amap, asyncio.sleep, autojump=True)
+
+
+def test_amap_trio():
+    trio = pytest.importorskip("trio")
+    testing = pytest.importorskip("trio.testing")
+    clock = testing.MockClock(autojump_threshold=0)
+    trio.run(check_amap, trio.sleep, clock=clock)
+
+
+def test_amap_bad_args():
+    async def main(concurrency, window):
+        source = Source(range(1), asyncio.sleep).agen()
+        with pytest.raises(ValueError):
+            async with amap(None, source, concurrency, window=window):
+                pass  # pragma: no cover
+        # The source is closed anyway
+        with pytest.raises(StopAsyncIteration):
+            await source.__anext__()
+
+    run_asyncio(main, 0, None)
+    run_asyncio(main, 3, 2)
+
+
+# These run in worker processes, so they have to be picklable
+def square(x):
+    if x == 13:
+        raise KeyError(x)
+    return x * x
+
+
+def slow_square(x):
+    import time
+    time.sleep(x / 10)
+    return x * x
+
+
+@async_generator
+async def numbers(values):
+    for value in values:
+        await yield_(value)
+
+
+async def check_aprocess_map(sleep):
+    source = numbers(range(13))
+    async with aprocess_map(square, source, workers=2, chunksize=4) as results:
+        assert await collect(results) == [i * i for i in range(13)]
+
+    # A chunk that fails still gives us the results from before the error
+    producer = Source(range(20), sleep)
+    collected = []
+    with pytest.raises(KeyError):
+        async with aprocess_map(square, producer.agen(), workers=2,
+                                chunksize=4) as results:
+            async for result in results:
+                collected.append(result)
+    assert collected == [i * i for i in range(13)]
+    assert producer.closed
+
+    # At most 'window' chunks are taken from the source ahead of us
+    producer = Source(range(100), sleep)
+    async with aprocess_map(slow_square, producer.agen(), workers=2,
+                            chunksize=1, window=2) as results:
+        assert await results.__anext__() == 0
+        await sleep(0.05)
+        assert producer.produced == 2
+    assert producer.closed
+
+    async with aprocess_map(slow_square, numbers([3, 0, 0]), workers=3,
+                            chunksize=1, ordered=False) as results:
+        assert await collect(results) == [0, 0, 9]
+
+
+def test_aprocess_map_asyncio():
+    run_asyncio(check_aprocess_map, asyncio.sleep)
+
+
+def test_aprocess_map_trio():
+    trio = pytest.importorskip("trio")
+    trio.run(check_aprocess_map, trio.sleep)
+
+
+def test_aprocess_map_bad_args():
+    async def main(workers=1, chunksize=1, window=None):
+        source = Source(range(1), asyncio.sleep).agen()
+        with pytest.raises(ValueError):
+            async with aprocess_map(square, source, workers, chunksize,
+                                    window=window):
+                pass  # pragma: no cover
+        # The source is closed anyway
+        with pytest.raises(StopAsyncIteration):
+            await source.__anext__()
+
+    run_asyncio(main, 0)
+    run_asyncio(main, 1, 0)
+    run_asyncio(main, 1, 1, 0)
+
+
+async def check_amerge(sleep):
+    # A hot source that always has something ready doesn't starve the
+    # others
+    hot = Source([("hot", i) for i in range(20)], sleep)
+    warm = Source([("warm", i) for i in range(3)], sleep)
+    async with amerge(hot.agen(), warm.agen()) as merged:
+        results = await collect(merged)
+    assert sorted(results) == sorted(
+        [("hot", i) for i in range(20)] + [("warm", i) for i in range(3)]
+    )
+    names = [name for (name, _) in results]
+    assert names[:6] == ["hot", "warm"] * 3
+    assert hot.closed and warm.closed
+
+    # Values come out as soon as they're ready: the slow one is ready at
+    # 0.035s, between the steady ones from 0.03s and 0.04s
+    steady = Source([("steady", i) for i in range(10)], sleep, 0.01)
+    slow = Source([("slow", 0)], sleep, 0.035)
+    async with amerge(steady.agen(), slow.agen()) as merged:
+        results = await collect(merged)
+    assert results.index(("slow", 0)) == 3
+
+    # Buffers are bounded
+    parts = [Source([(i, j) for j in range(10)], sleep) for i in range(3)]
+    async with amerge(*[part.agen() for part in parts],
+                      max_buffer=2) as merged:
+        assert (await merged.__anext__())[1] == 0
+        await sleep(0.01)
+        # Each has filled its buffer, plus the value we took from the first
+        assert [part.produced for part in parts] == [3, 2, 2]
+    assert all(part.closed for part in parts)
+
+    # An error in any source stops the others
+    parts = [
+        Source([("ok", 0), ("ok", 1)], sleep, 1),
+        Source([("bad", 0), KeyError("bad")], sleep),
+    ]
+    with pytest.raises(KeyError):
+        async with amerge(*[part.agen() for part in parts]) as merged:
+            await collect(merged)
+    assert all(part.closed for part in parts)
+
+
+# On virtual time, so the sources produce values exactly when their delays
+# say, however slow this machine is
+def test_amerge_asyncio():
+    run_asyncio(check_amerge, asyncio.sleep, autojump=True)
+
+
+def test_amerge_trio():
+    trio = pytest.importorskip("trio")
+    testing = pytest.importorskip("trio.testing")
+    clock = testing.MockClock(autojump_threshold=0)
+    trio.run(check_amerge, trio.sleep, clock=clock)
+
+
+def test_amerge_cancelled_trio():
+    trio = pytest.importorskip("trio")
+
+    async def main():
+        # Each source yields one value, then gets stuck
+        stuck = {1: 1000}
+        parts = [
+            Source([(i, 0), (i, 1)], trio.sleep, delays=stuck)
+            for i in range(3)
+        ]
+        with trio.move_on_after(0.05):
+            async with amerge(*[part.agen() for part in parts]) as merged:
+                async for _ in merged:
+                    pass
+        assert all(part.closed for part in parts)
+
+        # Breaking out of the loop is fine too
+        parts = [
+            Source([(i, 0), (i, 1)], trio.sleep, delays=stuck)
+            for i in range(3)
+        ]
+        async with amerge(*[part.agen() for part in parts]) as merged:
+            async for _ in merged:
+                break
+        assert all(part.closed for part in parts)
+
+    trio.run(main)
+
+
+def test_amerge_bad_args():
+    async def main():
+        source = Source(range(1), asyncio.sleep).agen()
+        with pytest.raises(ValueError):
+            async with amerge(source, max_buffer=0):
+                pass  # pragma: no cover
+        with pytest.raises(StopAsyncIteration):
+            await source.__anext__()
+
+    run_asyncio(main)
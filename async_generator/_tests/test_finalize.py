@@ -0,0 +1,277 @@
+import pytest
+
+import asyncio
+import gc
+
+from .conftest import run_asyncio
+from .. import (
+    async_generator,
+    yield_,
+    batched_finalizer,
+    shutdown_asyncgens,
+    get_asyncgen_hooks,
+)
+
+
+class CloseTracker:
+    def __init__(self, sleep):
+        self.sleep = sleep
+        self.closed = []
+        self.closing = 0
+        self.max_closing = 0
+
+    @async_generator
+    async def agen(self, i):
+        try:
+            await yield_(i)
+        finally:
+            self.closing += 1
+            self.max_closing = max(self.max_closing, self.closing)
+            await self.sleep(0)
+            await self.sleep(0)
+            self.closing -= 1
+            self.closed.append(i)
+
+    async def abandon(self, count):
+        for i in range(count):
+            agen = self.agen(i)
+            await agen.__anext__()
+            del agen
+        gc.collect()
+
+    async def wait_for(self, count):
+        while len(self.closed) < count:
+            await self.sleep(0)
+
+
+def test_batched_finalizer_asyncio():
+    tracker = CloseTracker(asyncio.sleep)
+
+    async def main():
+        hooks = get_asyncgen_hooks()
+        async with batched_finalizer(max_concurrency=3):
+            assert get_asyncgen_hooks() != hooks
+            await tracker.abandon(20)
+            assert tracker.closed == []
+            await tracker.wait_for(20)
+            # And it keeps going after the first batch
+            await tracker.abandon(5)
+            await tracker.wait_for(25)
+        assert get_asyncgen_hooks() == hooks
+
+    run_asyncio(main)
+    assert sorted(tracker.closed) == sorted(list(range(20)) + list(range(5)))
+    assert tracker.max_closing == 3
+
+
+def test_batched_finalizer_asyncio_closes_leftovers_on_exit():
+    tracker = CloseTracker(asyncio.sleep)
+
+    async def main():
+        async with batched_finalizer():
+            await tracker.abandon(10)
+        assert sorted(tracker.closed) == list(range(10))
+
+    run_asyncio(main)
+
+
+def test_batched_finalizer_asyncio_reports_errors():
+    @async_generator
+    async def broken():
+        try:
+            await yield_()
+        finally:
+            raise KeyError("oops")
+
+    errors = []
+
+    def handler(loop, context):
+        errors.append(context)
+
+    async def main():
+        asyncio.get_event_loop().set_exception_handler(handler)
+        async with batched_finalizer():
+            agen = broken()
+            await agen.__anext__()
+            del agen
+            gc.collect()
+            await asyncio.sleep(0.01)
+
+    run_asyncio(main)
+    [context] = errors
+    assert isinstance(context["exception"], KeyError)
+    assert "Exception ignored while finalizing" in context["message"]
+
+
+def test_batched_finalizer_native():
+    closed = []
+
+    @async_generator(native=True)
+    async def native(i):
+        try:
+            await yield_(i)
+        finally:
+            await asyncio.sleep(0)
+            closed.append(i)
+
+    async def main():
+        async with batched_finalizer():
+            for i in range(5):
+                agen = native(i)
+                await agen.__anext__()
+                del agen
+            gc.collect()
+            while len(closed) < 5:
+                await asyncio.sleep(0)
+
+    run_asyncio(main)
+    assert sorted(closed) == list(range(5))
+
+
+def test_batched_finalizer_outlived():
+    # A generator that's collected after the 'async with' goes to the
+    # previous finalizer, i.e. asyncio's own.
+    tracker = CloseTracker(asyncio.sleep)
+
+    async def main():
+        async with batched_finalizer():
+            agen = tracker.agen(0)
+            await agen.__anext__()
+        del agen
+        gc.collect()
+        await tracker.wait_for(1)
+
+    run_asyncio(main)
+    assert tracker.closed == [0]
+
+
+def test_batched_finalizer_trio():
+    trio = pytest.importorskip("trio")
+    tracker = CloseTracker(trio.sleep)
+
+    async def main():
+        async with batched_finalizer(max_concurrency=4):
+            await tracker.abandon(20)
+            await tracker.wait_for(20)
+            await tracker.abandon(3)
+
+    trio.run(main)
+    assert sorted(tracker.closed) == sorted(list(range(3)) + list(range(20)))
+    assert tracker.max_closing == 4
+
+
+def test_batched_finalizer_bad_args():
+    async def main():
+        async with batched_finalizer(max_concurrency=0):
+            pass  # pragma: no cover
+
+    with pytest.raises(ValueError):
+        run_asyncio(main)
+
+
+class Stubborn:
+    def __init__(self, sleep):
+        self.sleep = sleep
+
+    @async_generator
+    async def slow(self, i):
+        try:
+            await yield_(i)
+        finally:
+            await self.sleep(0.05)
+
+    @async_generator
+    async def ignores_exit(self):
+        try:
+            await yield_()
+        except GeneratorExit:
+            await yield_()
+
+    @async_generator
+    async def breaks(self):
+        try:
+            await yield_()
+        finally:
+            raise KeyError
+
+    @async_generator
+    async def hangs(self):
+        try:
+            await yield_()
+        finally:
+            await self.sleep(1000)
+
+    async def start_all(self):
+        agens = [self.slow(i) for i in range(10)]
+        agens += [self.ignores_exit(), self.breaks(), self.hangs()]
+        for agen in agens:
+            await agen.__anext__()
+        return agens
+
+
+def check_report(report, agens):
+    assert report.closed == 10
+    assert report.ignored_exit == [agens[10]]
+    [(agen, exc)] = report.failed
+    assert agen is agens[11]
+    assert isinstance(exc, KeyError)
+    assert report.unfinished == [agens[12]]
+
+
+def test_shutdown_asyncgens_asyncio():
+    import time
+
+    async def main():
+        async with batched_finalizer():
+            agens = await Stubborn(asyncio.sleep).start_all()
+            start = time.monotonic()
+            report = await shutdown_asyncgens(timeout=0.2)
+            # The slow ones were closed at the same time
+            assert time.monotonic() - start < 0.4
+            check_report(report, agens)
+            for agen in agens[:10]:
+                with pytest.raises(StopAsyncIteration):
+                    await agen.__anext__()
+
+            # Nothing left to do the second time around
+            report = await shutdown_asyncgens()
+            assert report == (0, [], [], [])
+
+    run_asyncio(main)
+
+
+def test_shutdown_asyncgens_trio():
+    trio = pytest.importorskip("trio")
+
+    async def main():
+        async with batched_finalizer(max_concurrency=20):
+            agens = await Stubborn(trio.sleep).start_all()
+            with trio.fail_after(1):
+                report = await shutdown_asyncgens(timeout=0.2)
+            check_report(report, agens)
+
+    trio.run(main)
+
+
+def test_shutdown_asyncgens_skips_running_generators():
+    async def main():
+        @async_generator
+        async def shuts_down_itself():
+            report = await shutdown_asyncgens()
+            await yield_(report)
+
+        async with batched_finalizer():
+            agen = shuts_down_itself()
+            report = await agen.__anext__()
+            assert report.unfinished == [agen]
+            await agen.aclose()
+
+    run_asyncio(main)
+
+
+def test_shutdown_asyncgens_needs_batched_finalizer():
+    async def main():
+        await shutdown_asyncgens()
+
+    with pytest.raises(RuntimeError):
+        run_asyncio(main)
@@ -0,0 +1,260 @@
+import pytest
+
+import inspect
+import sys
+
+from .conftest import mock_sleep
+from .. import (
+    async_generator,
+    yield_,
+    yield_from_,
+    yield_many_,
+    isasyncgenfunction,
+    asynccontextmanager,
+)
+from .. import _impl
+from .test_async_generator import collect, async_range
+
+pytestmark = pytest.mark.skipif(
+    sys.version_info < (3, 6),
+    reason="Python < 3.6 doesn't have native async generators"
+)
+
+
+def is_native(fn):
+    return inspect.isasyncgenfunction(fn)
+
+
+@async_generator(native=True)
+async def native_range(count):
+    for i in range(count):
+        await yield_(i)
+        await mock_sleep()
+
+
+async def test_native_basic():
+    assert is_native(native_range)
+    assert isasyncgenfunction(native_range)
+    assert native_range.__name__ == "native_range"
+    assert native_range.__wrapped__.__name__ == "native_range"
+    assert await collect(native_range(3)) == [0, 1, 2]
+
+
+@async_generator(native=True)
+async def native_echo():
+    received = []
+    try:
+        value = await yield_()
+        while True:
+            received.append(value)
+            value = await yield_(value=value * 2)
+    except KeyError:
+        await yield_(received)
+
+
+async def test_native_asend_athrow():
+    assert is_native(native_echo)
+    agen = native_echo()
+    assert await agen.asend(None) is None
+    assert await agen.asend(1) == 2
+    assert await agen.asend(5) == 10
+    assert await agen.athrow(KeyError) == [1, 5]
+    with pytest.raises(StopAsyncIteration):
+        await agen.__anext__()
+
+
+@async_generator
+async def returns_value():
+    await yield_(1)
+    assert (await yield_(2)) == "sent"
+    return "done"
+
+
+@async_generator(native=True)
+async def native_delegator(results):
+    await yield_from_(async_range(2))
+    result = await yield_from_(returns_value())
+    results.append(result)
+    await yield_("after")
+
+
+async def test_native_yield_from_():
+    assert is_native(native_delegator)
+    results = []
+    agen = native_delegator(results)
+    assert await agen.__anext__() == 0
+    assert await agen.__anext__() == 1
+    assert await agen.__anext__() == 1
+    assert await agen.__anext__() == 2
+    assert await agen.asend("sent") == "after"
+    assert results == ["done"]
+
+
+async def test_native_yield_from_athrow_and_aclose():
+    @async_generator
+    async def catcher(events):
+        try:
+            await yield_(1)
+        except ValueError:
+            events.append("caught")
+            await yield_(2)
+        try:
+            await yield_(3)
+        finally:
+            events.append("closed")
+
+    @async_generator(native=True)
+    async def delegate(events):
+        await yield_from_(catcher(events))
+
+    assert is_native(delegate)
+    events = []
+    agen = delegate(events)
+    assert await agen.__anext__() == 1
+    assert await agen.athrow(ValueError) == 2
+    assert await agen.__anext__() == 3
+    await agen.aclose()
+    assert events == ["caught", "closed"]
+
+
+async def test_native_yield_many_():
+    @async_generator(native=True)
+    async def batches():
+        await yield_many_([1, 2])
+        sent = await yield_many_("ab")
+        await yield_(sent)
+
+    assert is_native(batches)
+    agen = batches()
+    assert await agen.__anext__() == 1
+    assert await agen.__anext__() == 2
+    assert await agen.__anext__() == "a"
+    assert await agen.asend(1) == "b"
+    assert await agen.asend(2) == 2
+
+
+async def test_native_closure():
+    count = 1
+
+    @async_generator(native=True)
+    async def uses_closure():
+        await yield_(count)
+
+    assert is_native(uses_closure)
+    count = 2
+    assert await collect(uses_closure()) == [2]
+
+
+async def test_native_method():
+    class Multiplier:
+        def __init__(self, factor):
+            self.factor = factor
+
+        @async_generator(native=True)
+        async def multiply(self, ait):
+            async for value in ait:
+                await yield_(value * self.factor)
+
+    assert is_native(Multiplier.multiply)
+    assert await collect(Multiplier(3).multiply(async_range(3))) == [0, 3, 6]
+
+
+async def test_native_under_asynccontextmanager():
+    @asynccontextmanager
+    @async_generator(native=True)
+    async def manager():
+        await yield_("hi")
+
+    async with manager() as value:
+        assert value == "hi"
+
+
+async def test_native_nested_async_generator_is_fine():
+    @async_generator(native=True)
+    async def outer():
+        @async_generator
+        async def inner():
+            await yield_("inner")
+
+        await yield_from_(inner())
+
+    assert is_native(outer)
+    assert await collect(outer()) == ["inner"]
+
+
+# Each of these can't be expressed as a native async generator, so we should
+# quietly get the emulated version instead.
+
+
+async def test_native_fallback_return_value():
+    @async_generator(native=True)
+    async def returns():
+        await yield_(1)
+        return 2
+
+    assert not is_native(returns)
+    assert isasyncgenfunction(returns)
+    agen = returns()
+    assert isinstance(agen, _impl.AsyncGenerator)
+    assert await agen.__anext__() == 1
+    with pytest.raises(StopAsyncIteration) as excinfo:
+        await agen.__anext__()
+    assert excinfo.value.args == (2,)
+
+
+async def test_native_fallback_helper_yields_on_our_behalf():
+    @async_generator(native=True)
+    async def uses_helper():
+        async def helper():
+            await yield_(1)
+
+        await helper()
+
+    assert not is_native(uses_helper)
+    assert await collect(uses_helper()) == [1]
+
+
+async def test_native_fallback_yield_from_expression():
+    @async_generator(native=True)
+    async def yield_from_in_expression():
+        await yield_(await yield_from_(returns_value()) + "!")
+
+    assert not is_native(yield_from_in_expression)
+    agen = yield_from_in_expression()
+    assert await agen.__anext__() == 1
+    assert await agen.__anext__() == 2
+    assert await agen.asend("sent") == "done!"
+
+
+async def test_native_fallback_misc():
+    @async_generator(native=True)
+    async def no_yields():
+        pass
+
+    assert not is_native(no_yields)
+    assert await collect(no_yields()) == []
+
+    @async_generator(native=True)
+    async def yield_as_value():
+        fn = yield_
+        await fn(1)
+
+    assert not is_native(yield_as_value)
+    assert await collect(yield_as_value()) == [1]
+
+    namespace = {"async_generator": async_generator, "yield_": yield_}
+    exec(
+        "@async_generator(native=True)\n"
+        "async def no_source():\n"
+        "    await yield_(1)\n",
+        namespace,
+    )
+    assert not is_native(namespace["no_source"])
+    assert await collect(namespace["no_source"]()) == [1]
+
+
+def test_native_off_by_default():
+    assert not is_native(async_range)
+    assert not is_native(
+        async_generator(native=False)(async_range.__wrapped__)
+    )
@@ -0,0 +1,111 @@
+import pytest
+
+import itertools
+
+from .. import async_generator, yield_, aclosing, pipeline
+from .test_async_generator import collect
+from .test_tee import Source
+
+
+async def test_pipeline_matches_itertools():
+    stages = pipeline(
+        Source(range(100)).agen(),
+        pipeline.filter(lambda x: x % 3),
+        pipeline.map(lambda x: x * 2),
+        pipeline.enumerate(1),
+        pipeline.flat_map(lambda pair: [pair, pair]),
+        pipeline.islice(1, 40, 3),
+        pipeline.takewhile(lambda pair: pair[0] < 15),
+    )
+    expected = itertools.takewhile(
+        lambda pair: pair[0] < 15,
+        itertools.islice(
+            itertools.chain.from_iterable(
+                [pair, pair]
+                for pair in enumerate((x * 2 for x in range(100) if x % 3), 1)
+            ), 1, 40, 3
+        )
+    )
+    assert await collect(stages) == list(expected)
+
+
+async def test_pipeline_fuses_sync_stages():
+    source = Source(range(10)).agen()
+    fused = pipeline(
+        source,
+        pipeline.map(str),
+        pipeline.filter(lambda s: s != "3"),
+        pipeline.enumerate(),
+        pipeline.flat_map(lambda pair: pair),
+    )
+    # All four stages run in one generator, reading straight from the source
+    assert fused.ag_frame.f_locals["source"] is source
+    assert await collect(fused) == [
+        value for (i, s) in enumerate(str(x) for x in range(10) if x != 3)
+        for value in (i, s)
+    ]
+
+
+async def test_pipeline_async_stages():
+    @async_generator
+    async def repeat(agen):
+        async with aclosing(agen):
+            async for value in agen:
+                await yield_(value)
+                await yield_(value)
+
+    stages = pipeline(
+        Source(range(5)).agen(),
+        pipeline.map(lambda x: x + 1),
+        repeat,
+        pipeline.enumerate(),
+        pipeline.islice(5),
+    )
+    assert await collect(stages) == [(0, 1), (1, 1), (2, 2), (3, 2), (4, 3)]
+
+    source = Source(range(3))
+    agen = source.agen()
+    assert pipeline(agen) is agen
+    assert await collect(pipeline(source.agen(), repeat)) == [0, 0, 1, 1, 2, 2]
+
+
+async def test_pipeline_stops_early():
+    source = Source(range(100))
+    stages = pipeline(source.agen(), pipeline.islice(3))
+    assert await collect(stages) == [0, 1, 2]
+    # It didn't ask for more than it needed
+    assert source.produced == 3
+    assert source.closed
+
+    source = Source(range(100))
+    stages = pipeline(
+        source.agen(), pipeline.takewhile(lambda x: x < 5), pipeline.map(str)
+    )
+    assert await collect(stages) == ["0", "1", "2", "3", "4"]
+    assert source.produced == 6
+    assert source.closed
+
+    source = Source(range(100))
+    stages = pipeline(source.agen(), pipeline.map(str), pipeline.islice(0))
+    assert await collect(stages) == []
+    assert source.produced == 0
+
+    source = Source(range(100))
+    stages = pipeline(source.agen(), pipeline.map(str))
+    assert await stages.__anext__() == "0"
+    await stages.aclose()
+    assert source.closed
+
+
+async def test_pipeline_errors():
+    source = Source(range(10))
+    stages = pipeline(source.agen(), pipeline.map(lambda x: 10 // (5 - x)))
+    with pytest.raises(ZeroDivisionError):
+        await collect(stages)
+    assert source.produced == 6
+    assert source.closed
+
+    with pytest.raises(ValueError):
+        pipeline.islice(-1)
+    with pytest.raises(ValueError):
+        pipeline.islice(0, 10, 0)
@@ -0,0 +1,88 @@
+import pytest
+
+import gc
+
+from .. import (
+    async_generator,
+    yield_,
+    track_asyncgens,
+    asyncgen_census,
+    format_asyncgen_census,
+)
+
+
+@pytest.fixture
+def tracking():
+    track_asyncgens(traceback_rate=1.0)
+    try:
+        yield
+    finally:
+        track_asyncgens(False)
+
+
+@async_generator
+async def holds_buffer(size):
+    buffer = bytearray(size)
+    await yield_(len(buffer))
+
+
+@async_generator
+async def other():
+    await yield_()
+
+
+def entry_for(fn):
+    for entry in asyncgen_census():
+        if entry.code is fn.__wrapped__.__code__:
+            return entry
+    return None
+
+
+async def test_census(tracking):
+    agens = [holds_buffer(1000) for _ in range(3)]
+    await agens[0].__anext__()
+    await agens[1].__anext__()
+    await agens[1].aclose()
+    other_agen = other()
+
+    census = asyncgen_census()
+    names = [entry.code.co_name for entry in census]
+    assert names == ["holds_buffer", "other"]
+    entry = census[0]
+    assert entry.count == 3
+    assert entry.states == {"created": 1, "suspended": 1, "closed": 1}
+    # Only the suspended one has a frame holding the buffer
+    assert 1000 < entry.locals_size < 2000
+    assert len(entry.tracebacks) == 3
+    stack = entry.tracebacks[0]
+    assert "agens = [holds_buffer(1000)" in stack[-1].line
+    assert "test_census" in [frame.name for frame in stack]
+
+    text = format_asyncgen_census()
+    assert "holds_buffer" in text
+    assert "3 alive (1 closed, 1 created, 1 suspended)" in text
+    assert "Created at (sample):" in text
+    assert "test_census" in text
+
+    del agens, other_agen
+    gc.collect()
+    assert entry_for(holds_buffer) is None
+    assert asyncgen_census() == []
+
+
+async def test_census_sampling():
+    track_asyncgens(traceback_rate=0.0)
+    try:
+        agen = other()
+        assert entry_for(other).count == 1
+        assert entry_for(other).tracebacks == []
+        await agen.aclose()
+    finally:
+        track_asyncgens(False)
+
+
+def test_census_off():
+    with pytest.raises(RuntimeError):
+        asyncgen_census()
+    with pytest.raises(ValueError):
+        track_asyncgens(traceback_rate=2)
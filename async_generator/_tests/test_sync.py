@@ -0,0 +1,208 @@
+import pytest
+
+import asyncio
+import gc
+import threading
+import time
+
+from .conftest import mock_sleep
+from .. import (
+    async_generator,
+    yield_,
+    yield_from_,
+    yield_many_,
+    iterate_sync,
+    to_sync_iter,
+)
+
+
+@async_generator
+async def transform(values):
+    for value in values:
+        # Doesn't need an event loop
+        await asyncio.sleep(0)
+        await yield_(value * 2)
+
+
+@async_generator
+async def pipeline():
+    await yield_from_(transform([1, 2]))
+    await yield_many_([5, 6])
+
+
+def test_iterate_sync():
+    assert list(iterate_sync(transform(range(4)))) == [0, 2, 4, 6]
+    assert list(iterate_sync(pipeline())) == [2, 4, 5, 6]
+
+
+def test_iterate_sync_native():
+    @async_generator(native=True)
+    async def native():
+        await asyncio.sleep(0)
+        await yield_(1)
+        await yield_(2)
+
+    assert list(iterate_sync(native())) == [1, 2]
+
+
+def test_iterate_sync_real_suspension():
+    events = []
+
+    @async_generator
+    async def needs_a_loop():
+        try:
+            await yield_(1)
+            await mock_sleep()
+        finally:
+            events.append("cleaned up")
+
+    it = iterate_sync(needs_a_loop())
+    assert next(it) == 1
+    with pytest.raises(RuntimeError) as excinfo:
+        next(it)
+    assert "mock_sleep" in str(excinfo.value)
+    assert events == ["cleaned up"]
+
+    @async_generator
+    async def stubborn():
+        try:
+            await mock_sleep()
+        except RuntimeError:
+            await mock_sleep()
+
+    with pytest.raises(RuntimeError):
+        next(iterate_sync(stubborn()))
+
+
+def test_iterate_sync_send_throw_close():
+    events = []
+
+    @async_generator
+    async def echo():
+        try:
+            received = None
+            while True:
+                try:
+                    received = await yield_(received)
+                except KeyError as exc:
+                    received = "caught {!r}".format(exc.args[0])
+        finally:
+            events.append("closed")
+
+    it = iterate_sync(echo())
+    assert next(it) is None
+    assert it.send("hi") == "hi"
+    assert next(it) is None
+    assert it.throw(KeyError("oops")) == "caught 'oops'"
+    it.close()
+    assert events == ["closed"]
+
+
+class Ticker:
+    def __init__(self, count, fail=False):
+        self.count = count
+        self.fail = fail
+        self.produced = 0
+        self.closed = threading.Event()
+        self.threads = set()
+
+    @async_generator
+    async def agen(self):
+        try:
+            for i in range(self.count):
+                self.threads.add(threading.current_thread())
+                await asyncio.sleep(0)
+                self.produced += 1
+                await yield_(i)
+            if self.fail:
+                raise KeyError("oops")
+        finally:
+            self.closed.set()
+
+
+def test_to_sync_iter():
+    ticker = Ticker(1000)
+    assert list(to_sync_iter(ticker.agen())) == list(range(1000))
+    assert ticker.closed.is_set()
+    assert ticker.threads
+    assert threading.current_thread() not in ticker.threads
+
+    # A second one runs in the same loop
+    other = Ticker(3)
+    assert list(to_sync_iter(other.agen())) == [0, 1, 2]
+    assert other.threads == ticker.threads
+
+    @async_generator
+    async def nested():
+        await yield_(list(to_sync_iter(Ticker(3).agen())))
+
+    with pytest.raises(RuntimeError):
+        list(to_sync_iter(nested()))
+
+
+def test_to_sync_iter_prefetch():
+    ticker = Ticker(1000)
+    it = to_sync_iter(ticker.agen(), prefetch=10)
+    assert next(it) == 0
+    time.sleep(0.1)
+    # At most one batch that we're working through, and a full buffer
+    assert 10 < ticker.produced <= 20
+    assert list(it) == list(range(1, 1000))
+
+
+def test_to_sync_iter_errors():
+    ticker = Ticker(3, fail=True)
+    it = to_sync_iter(ticker.agen())
+    assert [next(it) for _ in range(3)] == [0, 1, 2]
+    with pytest.raises(KeyError):
+        next(it)
+    with pytest.raises(StopIteration):
+        next(it)
+
+    # Same for other async iterators, where anext_batch() can't hold the
+    # exception back
+    @async_generator(native=True)
+    async def native_fails():
+        await yield_(0)
+        await yield_(1)
+        raise KeyError("oops")
+
+    it = to_sync_iter(native_fails())
+    assert [next(it) for _ in range(2)] == [0, 1]
+    with pytest.raises(KeyError):
+        next(it)
+
+    ticker = Ticker(3)
+    with pytest.raises(ValueError):
+        next(to_sync_iter(ticker.agen(), prefetch=0))
+    # The source is closed anyway (before it ever started)
+    assert ticker.produced == 0
+
+
+def test_to_sync_iter_close():
+    ticker = Ticker(10**6)
+    it = to_sync_iter(ticker.agen(), prefetch=5)
+    assert next(it) == 0
+    it.close()
+    # close() waits for aclose() to finish
+    assert ticker.closed.is_set()
+
+    ticker = Ticker(10**6)
+    it = to_sync_iter(ticker.agen())
+    next(it)
+    del it
+    gc.collect()
+    assert ticker.closed.is_set()
+
+    @async_generator
+    async def broken():
+        try:
+            await yield_(1)
+            await yield_(2)
+        finally:
+            raise KeyError("oops")
+
+    it = to_sync_iter(broken(), prefetch=1)
+    assert next(it) == 1
+    with pytest.raises(KeyError):
+        it.close()
@@ -0,0 +1,218 @@
+import pytest
+
+import asyncio
+import gc
+
+from .conftest import mock_sleep, run_asyncio
+from .. import async_generator, yield_, atee
+from .test_async_generator import collect
+
+
+# An async generator for tests to consume, which counts the values it's
+# produced and notes when it's been closed. Values that are exceptions are
+# raised instead of yielded. Before each value it awaits sleep(delay), where
+# the delay is delays[i] for the i'th value if there is one, and 'delay'
+# otherwise.
+class Source:
+    def __init__(self, values, sleep=mock_sleep, delay=0, delays=None):
+        self.values = list(values)
+        self.sleep = sleep
+        self.delay = delay
+        self.delays = {} if delays is None else delays
+        self.produced = 0
+        self.closed = False
+
+    @async_generator
+    async def agen(self):
+        try:
+            for i, value in enumerate(self.values):
+                await self.sleep(self.delays.get(i, self.delay))
+                if isinstance(value, Exception):
+                    raise value
+                self.produced += 1
+                await yield_(value)
+        finally:
+            self.closed = True
+
+
+async def test_atee_basic():
+    source = Source(range(5))
+    a, b, c = atee(source.agen(), 3)
+    assert await a.__anext__() == 0
+    assert await a.__anext__() == 1
+    assert await b.__anext__() == 0
+    assert source.produced == 2
+    assert await collect(c) == [0, 1, 2, 3, 4]
+    assert await collect(a) == [2, 3, 4]
+    assert await collect(b) == [1, 2, 3, 4]
+    assert source.produced == 5
+
+
+async def test_atee_closes_source_when_all_consumers_are_closed():
+    source = Source(range(5))
+    a, b = atee(source.agen())
+    assert await a.__anext__() == 0
+    await a.aclose()
+    assert not source.closed
+    assert await b.__anext__() == 0
+    assert await b.__anext__() == 1
+    await b.aclose()
+    # The source is closed once every consumer is done with it
+    assert source.closed
+    assert source.produced == 2
+
+
+async def test_atee_unstarted_consumers():
+    source = Source(range(5))
+    a, b, c = atee(source.agen(), 3, max_buffer=1)
+    await a.aclose()
+    del b
+    gc.collect()
+    # Neither of them holds c back
+    assert await collect(c) == [0, 1, 2, 3, 4]
+
+    agen = Source(range(5)).agen()
+    (a,) = atee(agen, 1)
+    await a.aclose()
+    # It was closed before it ever started
+    with pytest.raises(StopAsyncIteration):
+        await agen.__anext__()
+
+
+async def test_atee_frees_items_everyone_has_seen():
+    a, b = atee(Source(range(10)).agen(), max_buffer=4)
+    tee = a.ag_frame.f_locals["self"]
+    assert await a.__anext__() == 0
+    assert await a.__anext__() == 1
+    assert tee._ring == [0, 1, None, None]
+    assert await b.__anext__() == 0
+    assert tee._ring == [None, 1, None, None]
+    await b.aclose()
+    # Now nobody needs item 1 either
+    assert tee._ring == [None, None, None, None]
+    assert await collect(a) == list(range(2, 10))
+
+
+async def test_atee_errors():
+    source = Source([0, 1, KeyError("oops")])
+    a, b = atee(source.agen())
+    for consumer in (a, b):
+        assert await consumer.__anext__() == 0
+        assert await consumer.__anext__() == 1
+        with pytest.raises(KeyError):
+            await consumer.__anext__()
+        with pytest.raises(StopAsyncIteration):
+            await consumer.__anext__()
+    assert source.closed
+
+    (a,) = atee(Source(range(2)).agen(), 1)
+    await a.__anext__()
+    with pytest.raises(TypeError):
+        await a.asend("hi")
+
+    with pytest.raises(ValueError):
+        atee(Source(range(1)).agen(), -1)
+    with pytest.raises(ValueError):
+        atee(Source(range(1)).agen(), max_buffer=0)
+
+
+def test_atee_cancelled_mid_fetch():
+    async def main():
+        source = Source(range(10), asyncio.sleep, delays={2: 10})
+        a, b = atee(source.agen())
+        assert await a.__anext__() == 0
+        assert await a.__anext__() == 1
+        # a starts fetching item 2, and gets cancelled while it waits
+        task = asyncio.ensure_future(a.__anext__())
+        await asyncio.sleep(0)
+        task.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await task
+        assert source.closed
+        # b still gets what was fetched before, but then it's told the
+        # source broke, rather than that it ran out
+        assert await b.__anext__() == 0
+        assert await b.__anext__() == 1
+        with pytest.raises(RuntimeError) as excinfo:
+            await b.__anext__()
+        assert isinstance(excinfo.value.__cause__, asyncio.CancelledError)
+
+    run_asyncio(main)
+
+
+def test_atee_cancelled_mid_fetch_trio():
+    trio = pytest.importorskip("trio")
+
+    async def main():
+        source = Source(range(10), trio.sleep, delays={2: 10})
+        a, b = atee(source.agen())
+        assert await a.__anext__() == 0
+        assert await a.__anext__() == 1
+        # The first checkpoint in here is the source's sleep before item 2
+        with trio.move_on_after(0):
+            await a.__anext__()
+        assert source.closed
+        assert await b.__anext__() == 0
+        assert await b.__anext__() == 1
+        with pytest.raises(RuntimeError) as excinfo:
+            await b.__anext__()
+        assert isinstance(excinfo.value.__cause__, trio.Cancelled)
+
+    trio.run(main)
+
+
+def check_backpressure(sleep, run):
+    log = []
+
+    @async_generator
+    async def source():
+        for i in range(10):
+            log.append(("produced", i))
+            await yield_(i)
+
+    async def consume(name, agen, delay):
+        async for value in agen:
+            log.append((name, value))
+            await sleep(delay)
+
+    async def main(spawn_both):
+        fast, slow = atee(source(), max_buffer=3)
+        await spawn_both(
+            consume("fast", fast, 0), consume("slow", slow, 0.001)
+        )
+
+    run(main)
+    produced = 0
+    slow_seen = 0
+    for (what, value) in log:
+        if what == "produced":
+            produced += 1
+        elif what == "slow":
+            slow_seen += 1
+        # The producer never gets more than 3 ahead of the slow consumer
+        assert produced - slow_seen <= 3
+    assert log.count(("produced", 9)) == 1
+    assert ("slow", 9) in log and ("fast", 9) in log
+
+
+def test_atee_backpressure_asyncio():
+    async def spawn_both(*coros):
+        await asyncio.gather(*coros)
+
+    check_backpressure(
+        asyncio.sleep, lambda main: run_asyncio(main, spawn_both)
+    )
+
+
+def test_atee_backpressure_trio():
+    trio = pytest.importorskip("trio")
+
+    async def spawn_both(*coros):
+        async def run(coro):
+            await coro
+
+        async with trio.open_nursery() as nursery:
+            for coro in coros:
+                nursery.start_soon(run, coro)
+
+    check_backpressure(trio.sleep, lambda main: trio.run(main, spawn_both))
@@ -0,0 +1,206 @@
+import pytest
+
+import asyncio
+import gc
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from .conftest import run_asyncio
+from .. import from_sync_iter, aclosing
+from .. import _threads
+from .test_async_generator import collect
+
+
+# Notes how many items from_sync_iter() asks for on each trip to the thread
+class CountingExecutor(ThreadPoolExecutor):
+    def __init__(self):
+        super().__init__(max_workers=1)
+        self.chunks = []
+
+    def submit(self, fn, max_items):
+        self.chunks.append(max_items)
+        return super().submit(fn, max_items)
+
+
+# Stands in for perf_counter(), so chunk timing doesn't depend on how fast
+# this machine happens to be. Time only moves when a test moves it.
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(_threads, "perf_counter", clock)
+    return clock
+
+
+# Taking an item costs no time, so every chunk comes back full and quick, and
+# each one is twice as big as the last, up to the limit
+GROWING_CHUNKS = [1, 2, 4, 8, 16, 32, 64] + [100] * 9
+
+
+class Blocking:
+    def __init__(self, count, delay=0, fail=False):
+        self.count = count
+        self.delay = delay
+        self.fail = fail
+        self.produced = 0
+        self.threads = set()
+        self.closed = threading.Event()
+
+    def __iter__(self):
+        try:
+            for i in range(self.count):
+                self.threads.add(threading.get_ident())
+                time.sleep(self.delay)
+                self.produced += 1
+                yield i
+            if self.fail:
+                raise KeyError("oops")
+        finally:
+            self.closed.set()
+
+
+def test_from_sync_iter_asyncio(clock):
+    source = Blocking(1000)
+
+    async def main():
+        with CountingExecutor() as executor:
+            agen = from_sync_iter(source, executor=executor, chunk_size=100)
+            assert await collect(agen) == list(range(1000))
+            # Chunks grew from 1 to 100, instead of one trip per item
+            assert executor.chunks == GROWING_CHUNKS
+
+    run_asyncio(main)
+    assert threading.get_ident() not in source.threads
+    assert source.closed.is_set()
+
+
+def test_from_sync_iter_chunks_shrink(clock):
+    # The first 20 items are free, and after that each one takes 2ms
+    def timed():
+        for i in range(40):
+            if i >= 20:
+                clock.now += 0.002
+            yield i
+
+    async def main():
+        with CountingExecutor() as executor:
+            agen = from_sync_iter(timed(), executor=executor)
+            assert await collect(agen) == list(range(40))
+        # The chunk of 16 ran out of time after 8 items (15-22), and then
+        # each chunk ran out after 3, until they were down to 2 items, which
+        # fit in _CHUNK_TIME but take too long to grow again
+        assert executor.chunks == [1, 2, 4, 8, 16, 8, 4] + [2] * 6
+
+    run_asyncio(main)
+
+
+def test_from_sync_iter_slow_iterator():
+    source = Blocking(20, delay=0.004)
+
+    async def main():
+        agen = from_sync_iter(source)
+        assert await agen.__anext__() == 0
+        # We didn't have to wait for a whole chunk to get the first item
+        assert source.produced == 1
+        assert await collect(agen) == list(range(1, 20))
+
+    run_asyncio(main)
+
+
+def test_from_sync_iter_aclose():
+    source = Blocking(1000)
+
+    async def main():
+        async with aclosing(from_sync_iter(source)) as agen:
+            assert await agen.__anext__() == 0
+        assert source.closed.is_set()
+
+    run_asyncio(main)
+    assert source.produced < 1000
+
+
+def test_from_sync_iter_del():
+    source = Blocking(1000)
+
+    async def main():
+        agen = from_sync_iter(source)
+        assert await agen.__anext__() == 0
+        del agen
+        gc.collect()
+        for _ in range(10):
+            await asyncio.sleep(0)
+        assert source.closed.is_set()
+
+    run_asyncio(main)
+
+
+def test_from_sync_iter_cancelled_in_the_middle_of_a_chunk():
+    release = threading.Event()
+    closed = threading.Event()
+
+    def stuck():
+        try:
+            yield 0
+            release.wait()
+            yield 1  # pragma: no cover
+        finally:
+            closed.set()
+
+    async def main():
+        agen = from_sync_iter(stuck())
+        assert await agen.__anext__() == 0
+        with pytest.raises(asyncio.TimeoutError):
+            await asyncio.wait_for(agen.__anext__(), 0.05)
+        # The worker thread is still inside next(), so it can't be closed
+        # yet, but it will be as soon as next() returns
+        assert not closed.is_set()
+        release.set()
+        await asyncio.get_event_loop().run_in_executor(None, closed.wait, 5)
+        assert closed.is_set()
+
+    run_asyncio(main)
+
+
+def test_from_sync_iter_errors():
+    async def main():
+        agen = from_sync_iter(Blocking(3, fail=True))
+        for i in range(3):
+            assert await agen.__anext__() == i
+        with pytest.raises(KeyError):
+            await agen.__anext__()
+
+        agen = from_sync_iter([1, 2])
+        await agen.__anext__()
+        with pytest.raises(TypeError):
+            await agen.asend("hi")
+
+        source = Blocking(3)
+        with pytest.raises(ValueError):
+            await from_sync_iter(iter(source), chunk_size=0).__anext__()
+
+    run_asyncio(main)
+
+
+def test_from_sync_iter_trio(clock):
+    trio = pytest.importorskip("trio")
+    source = Blocking(500)
+
+    async def main():
+        assert await collect(from_sync_iter(source)) == list(range(500))
+        with CountingExecutor() as executor:
+            agen = from_sync_iter(
+                range(1000), executor=executor, chunk_size=100
+            )
+            assert await collect(agen) == list(range(1000))
+            assert executor.chunks == GROWING_CHUNKS
+
+    trio.run(main)
+    assert source.closed.is_set()
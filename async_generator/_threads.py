@@ -0,0 +1,105 @@
+import threading
+from time import perf_counter
+
+from ._impl import async_generator, yield_
+from ._backends import current_backend
+
+# from_sync_iter() runs a blocking iterator in a worker thread, but instead of
+# one trip to the thread and back for every item, each trip pulls a chunk of
+# them. Chunks start out at one item, so the first one arrives as soon as
+# possible, and then grow (up to chunk_size) for as long as a whole chunk
+# still takes less than _CHUNK_TIME, and shrink again if it takes longer.
+# That way, fast iterators go in big chunks, and slow ones don't make us wait
+# for lots of items before we get to see the first of them.
+
+_CHUNK_TIME = 0.005
+
+
+class _ChunkPuller:
+    def __init__(self, iterable):
+        self._it = iter(iterable)
+        # Protects _busy and _close_requested. The iterator itself is only
+        # ever touched by one thread at a time, because we don't ask for a
+        # new chunk until the last one is done.
+        self._lock = threading.Lock()
+        self._busy = False
+        self._close_requested = False
+        self._closed = False
+
+    # Runs in the worker thread. Returns (items, done, exc, elapsed).
+    def pull(self, max_items):
+        with self._lock:
+            if self._close_requested:
+                # We were abandoned before the thread even got to this
+                return ([], True, None, 0.0)
+            self._busy = True
+        items = []
+        done = False
+        exc = None
+        start = perf_counter()
+        try:
+            while len(items) < max_items:
+                items.append(next(self._it))
+                if perf_counter() - start > _CHUNK_TIME:
+                    break
+        except StopIteration:
+            done = True
+        except Exception as e:
+            done = True
+            exc = e
+        finally:
+            with self._lock:
+                self._busy = False
+                close = self._close_requested
+            if close:
+                # We were abandoned in the middle of this chunk
+                self._close()
+        return (items, done, exc, perf_counter() - start)
+
+    # Can be called from any thread, including from a finalizer. If a chunk
+    # is being pulled right now, the thread that's pulling it closes the
+    # iterator when it's done.
+    def close(self):
+        with self._lock:
+            self._close_requested = True
+            if self._busy:
+                return
+        self._close()
+
+    def _close(self):
+        if self._closed:
+            return
+        self._closed = True
+        close = getattr(self._it, "close", None)
+        if close is not None:
+            close()
+
+
+@async_generator
+async def from_sync_iter(iterable, executor=None, chunk_size=256):
+    puller = _ChunkPuller(iterable)
+    try:
+        if chunk_size < 1:
+            raise ValueError("chunk_size must be at least 1")
+        backend = current_backend()
+        size = 1
+        while True:
+            (items, done, exc, elapsed) = await backend.run_in_thread(
+                executor, puller.pull, size
+            )
+            if len(items) < size and not done:
+                # It ran out of time
+                size = max(size // 2, 1)
+            elif elapsed < _CHUNK_TIME / 2:
+                size = min(size * 2, chunk_size)
+            for item in items:
+                if (await yield_(item)) is not None:
+                    raise TypeError(
+                        "can't send non-None value to from_sync_iter()"
+                    )
+            if exc is not None:
+                raise exc
+            if done:
+                return
+    finally:
+        puller.close()
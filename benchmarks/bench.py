@@ -0,0 +1,431 @@
+"""Benchmarks for async_generator, with native async generators as baseline.
+
+Run from the root of a checkout with::
+
+    python benchmarks/bench.py               # everything
+    python benchmarks/bench.py yield_from    # just cases matching a pattern
+
+This only needs the standard library (and Python 3.6+, for the native
+baselines), so it works offline. Every case runs twice: once using this
+library, and once doing the same thing with a native async generator. We
+report, per item:
+
+* ns: best wall-clock time over several repeats.
+* peak B/item: the high-water mark of memory traced by tracemalloc while
+  running the case, above what was allocated before it started, divided by
+  the number of items. Normally each item's garbage is freed before the next
+  item starts, so the peak is about one item's worth, and this comes out
+  well under a byte; if items leave reference cycles behind, the peak grows
+  with every item until the cyclic GC runs, and this is how much each one
+  adds. (Stock CPython doesn't keep a cumulative allocation count, so this
+  is the closest thing we can measure without a special build.)
+
+Everything is driven by hand with coroutine.send() and never suspends, so
+there's no event loop overhead in the numbers -- only the cost of the
+generator machinery itself.
+"""
+
+import argparse
+import gc
+import re
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from async_generator import (  # noqa: E402
+    aclosing,
+    async_generator,
+    asynccontextmanager,
+    get_asyncgen_hooks,
+    pipeline,
+    set_asyncgen_hooks,
+    yield_,
+    yield_from_,
+    yield_many_,
+)
+
+################################################################
+# Generators under test
+################################################################
+
+
+@async_generator
+async def lib_range(count):
+    for i in range(count):
+        await yield_(i)
+
+
+async def native_range(count):
+    for i in range(count):
+        yield i
+
+
+@async_generator(native=True)
+async def compiled_range(count):
+    for i in range(count):
+        await yield_(i)
+
+
+@async_generator
+async def lib_range_many(count):
+    for start in range(0, count, 100):
+        await yield_many_(range(start, min(start + 100, count)))
+
+
+@async_generator
+async def lib_echo():
+    value = None
+    while True:
+        value = await yield_(value)
+
+
+async def native_echo():
+    value = None
+    while True:
+        value = yield value
+
+
+@async_generator
+async def lib_catcher():
+    while True:
+        try:
+            await yield_()
+        except ValueError:
+            pass
+
+
+async def native_catcher():
+    while True:
+        try:
+            yield
+        except ValueError:
+            pass
+
+
+@async_generator
+async def lib_delegate(agen):
+    await yield_from_(agen)
+
+
+async def native_delegate(agen):
+    # Native async generators can't 'yield from', so this is what you'd
+    # write instead.
+    async for value in agen:
+        yield value
+
+
+@async_generator
+async def lib_one_value():
+    await yield_(None)
+
+
+async def native_one_value():
+    yield None
+
+
+@asynccontextmanager
+@async_generator
+async def lib_manager():
+    await yield_(None)
+
+
+@asynccontextmanager
+async def native_manager():
+    yield None
+
+
+LIB = {
+    "range": lib_range,
+    "echo": lib_echo,
+    "catcher": lib_catcher,
+    "delegate": lib_delegate,
+    "one_value": lib_one_value,
+    "manager": lib_manager,
+}
+
+NATIVE = {
+    "range": native_range,
+    "echo": native_echo,
+    "catcher": native_catcher,
+    "delegate": native_delegate,
+    "one_value": native_one_value,
+    "manager": native_manager,
+}
+
+################################################################
+# Cases
+#
+# Each case takes a dict of generator functions (LIB or NATIVE) and the
+# number of items, and returns a coroutine that processes that many items.
+################################################################
+
+CASES = []
+
+
+def case(name):
+    def decorator(fn):
+        CASES.append((name, fn))
+        return fn
+
+    return decorator
+
+
+@case("iterate")
+async def iterate(gens, count):
+    async for _ in gens["range"](count):
+        pass
+
+
+@case("asend")
+async def asend(gens, count):
+    agen = gens["echo"]()
+    await agen.asend(None)
+    for i in range(count):
+        await agen.asend(i)
+    await agen.aclose()
+
+
+@case("athrow")
+async def athrow(gens, count):
+    agen = gens["catcher"]()
+    await agen.asend(None)
+    exc = ValueError()
+    for _ in range(count):
+        await agen.athrow(exc)
+    await agen.aclose()
+
+
+def make_yield_from(depth):
+    async def yield_from(gens, count):
+        agen = gens["range"](count)
+        for _ in range(depth):
+            agen = gens["delegate"](agen)
+        async for _ in agen:
+            pass
+
+    return yield_from
+
+
+for _depth in (1, 4, 16):
+    case("yield_from depth={}".format(_depth))(make_yield_from(_depth))
+
+
+@case("aclose created")
+async def aclose_created(gens, count):
+    for _ in range(count):
+        await gens["one_value"]().aclose()
+
+
+@case("aclose suspended")
+async def aclose_suspended(gens, count):
+    for _ in range(count):
+        agen = gens["one_value"]()
+        await agen.__anext__()
+        await agen.aclose()
+
+
+@case("__del__ suspended")
+async def del_suspended(gens, count):
+    for _ in range(count):
+        agen = gens["one_value"]()
+        await agen.__anext__()
+        del agen
+
+
+def _close_now(agen):
+    run(agen.aclose())
+
+
+@case("finalizer hook")
+async def finalizer_hook(gens, count):
+    old_hooks = get_asyncgen_hooks()
+    set_asyncgen_hooks(finalizer=_close_now)
+    try:
+        for _ in range(count):
+            agen = gens["one_value"]()
+            await agen.__anext__()
+            del agen
+    finally:
+        set_asyncgen_hooks(*old_hooks)
+
+
+@case("asynccontextmanager")
+async def contextmanager(gens, count):
+    manager = gens["manager"]
+    for _ in range(count):
+        async with manager():
+            pass
+
+
+@case("aclosing")
+async def aclosing_(gens, count):
+    for _ in range(count):
+        async with aclosing(gens["range"](10)) as agen:
+            async for _ in agen:
+                break
+
+
+# These exercise features that native async generators don't have, so the
+# baseline is plain iteration.
+
+
+@case("iterate (native=True)")
+async def iterate_compiled(gens, count):
+    iterate_fn = compiled_range if gens is LIB else gens["range"]
+    async for _ in iterate_fn(count):
+        pass
+
+
+@case("iterate (yield_many_)")
+async def iterate_many(gens, count):
+    iterate_fn = lib_range_many if gens is LIB else gens["range"]
+    async for _ in iterate_fn(count):
+        pass
+
+
+@case("iterate (anext_batch)")
+async def iterate_batches(gens, count):
+    agen = gens["range"](count)
+    if gens is LIB:
+        try:
+            while True:
+                await agen.anext_batch(100)
+        except StopAsyncIteration:
+            pass
+    else:
+        async for _ in agen:
+            pass
+
+
+@case("iterate (many + batch)")
+async def iterate_many_batches(gens, count):
+    # Batched at both ends, so most values never resume the generator's body
+    if gens is LIB:
+        agen = lib_range_many(count)
+        try:
+            while True:
+                await agen.anext_batch(100)
+        except StopAsyncIteration:
+            pass
+    else:
+        async for _ in gens["range"](count):
+            pass
+
+
+async def native_map(fn, agen):
+    async for value in agen:
+        yield fn(value)
+
+
+async def native_filter(predicate, agen):
+    async for value in agen:
+        if predicate(value):
+            yield value
+
+
+@case("pipeline (3 stages)")
+async def pipeline_(gens, count):
+    # The natural way to write this with native async generators is a chain
+    # of them, one per stage; pipeline() fuses the stages into one.
+    def double(x):
+        return x * 2
+
+    def keep(x):
+        return x % 3
+
+    def halve(x):
+        return x // 2
+
+    if gens is LIB:
+        agen = pipeline(
+            lib_range(count),
+            pipeline.map(double),
+            pipeline.filter(keep),
+            pipeline.map(halve),
+        )
+    else:
+        agen = native_map(
+            halve,
+            native_filter(keep, native_map(double, native_range(count)))
+        )
+    async for _ in agen:
+        pass
+
+
+################################################################
+# Runner
+################################################################
+
+
+def run(coro):
+    try:
+        coro.send(None)
+    except StopIteration:
+        pass
+    else:  # pragma: no cover
+        raise RuntimeError("benchmark tried to suspend")
+
+
+def ns_per_item(fn, gens, count, repeat):
+    best = float("inf")
+    for _ in range(repeat):
+        gc.collect()
+        start = time.perf_counter()
+        run(fn(gens, count))
+        best = min(best, time.perf_counter() - start)
+    return best / count * 1e9
+
+
+def peak_bytes_per_item(fn, gens, count):
+    # Warm up first, so one-off allocations (caches, interned strings, ...)
+    # don't count.
+    run(fn(gens, min(count, 100)))
+    gc.collect()
+    tracemalloc.start()
+    try:
+        before, _ = tracemalloc.get_traced_memory()
+        run(fn(gens, count))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    return (peak - before) / count
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("pattern", nargs="?", default="")
+    parser.add_argument("--items", type=int, default=10000)
+    parser.add_argument("--repeat", type=int, default=5)
+    args = parser.parse_args()
+
+    row = "{:<24} {:>8} {:>10} {:>7} {:>16} {:>19}"
+    print(
+        row.format(
+            "case", "lib ns", "native ns", "ratio", "lib peak B/item",
+            "native peak B/item"
+        )
+    )
+    for name, fn in CASES:
+        if not re.search(args.pattern, name):
+            continue
+        lib_ns = ns_per_item(fn, LIB, args.items, args.repeat)
+        native_ns = ns_per_item(fn, NATIVE, args.items, args.repeat)
+        lib_bytes = peak_bytes_per_item(fn, LIB, args.items)
+        native_bytes = peak_bytes_per_item(fn, NATIVE, args.items)
+        print(
+            row.format(
+                name,
+                "{:.0f}".format(lib_ns),
+                "{:.0f}".format(native_ns),
+                "{:.1f}x".format(lib_ns / native_ns),
+                "{:.1f}".format(lib_bytes),
+                "{:.1f}".format(native_bytes),
+            )
+        )
+
+
+if __name__ == "__main__":
+    main()